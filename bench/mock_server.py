@@ -0,0 +1,359 @@
+import re
+import json
+import time
+import bisect
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from discord.snowflake import from_timestamp
+
+API_PREFIX = "/api/v9"
+VIEW_AND_READ = (1 << 10) | (1 << 16)
+MANAGE_MESSAGES = 1 << 13
+BULK_DELETE_AGE = 14 * 86400 * 1000
+USER_ID = "100000000000000001"
+OTHER_ID = "100000000000000002"
+
+# (limit, window seconds) per bucket, roughly what discord hands out to user accounts
+DEFAULT_LIMITS = {
+    "delete": (5, 5.0),
+    "messages": (50, 1.0),
+    "search": (10, 5.0),
+    "bulk": (1, 1.0),
+    "default": (50, 1.0),
+}
+GLOBAL_LIMIT = 50
+
+class MockBucket:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self.remaining = limit
+        self.reset_at = 0.0
+
+# a fake discord with a bunch of dms and guilds, just enough of the api for lazer to run against
+class MockDiscord:
+    def __init__(self, dms=4, guilds=0, guild_channels=3, threads=0, messages=1000, own_ratio=0.3,
+                 latency=0.05, jitter=0.02, limits=None, chaos=0.0, seed=1, span_days=3 * 365, manage=False):
+        self.random = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.chaos = chaos  # chance of a 429 the headers didnt announce, discord does that on deletes
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.manage = manage  # whether the user gets manage messages in the guilds
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.global_sent = []
+        self.stats = {"requests": 0, "pages": 0, "deletes": 0, "bulk_deletes": 0, "searches": 0, "rate_limited": 0}
+
+        self.channels = {}   # channel id -> {"ids": ascending int ids, "messages": id -> message}
+        self.dm_channels = []
+        self.guilds = []
+        self.guild_channels = {}
+        self.guild_threads = {}  # guild id -> active threads, they dont show up in the channel list
+        next_id = [200000000000000000]
+
+        def make_channel(name):
+            next_id[0] += 1
+            now = time.time() * 1000
+            span = span_days * 86400 * 1000  # spread the history over this many days
+            # created right before its first message, like a real channel id
+            channel_id = str(int(from_timestamp(now - span - 1000)) + next_id[0] % 4096)
+            ids = []
+            store = {}
+            # channels made in the same millisecond would share ids, give each its own worker bits
+            worker = (len(self.channels) % 1024) << 12
+            for i in range(messages):
+                message_id = int(from_timestamp(now - span + span * i / max(messages, 1))) + worker + i % 4096
+                author = USER_ID if self.random.random() < own_ratio else OTHER_ID
+                ids.append(message_id)
+                # a bit of everything so filters have something to pick from
+                link = f" https://example.com/{i}" if i % 5 == 0 else ""
+                store[message_id] = {
+                    "id": str(message_id),
+                    "channel_id": channel_id,
+                    "type": 19 if i % 3 == 0 else 0,
+                    "content": f"{name} message {i}{link}",
+                    "author": {"id": author, "username": "me" if author == USER_ID else "them"},
+                    "attachments": [{"filename": f"{i}.png", "url": f"https://cdn.example.com/{i}.png"}] if i % 7 == 0 else [],
+                    "embeds": [],
+                    "pinned": i % 11 == 0,
+                    "timestamp": None,
+                }
+            self.channels[channel_id] = {"ids": ids, "messages": store}
+            return channel_id
+
+        for i in range(dms):
+            channel_id = make_channel(f"dm{i}")
+            self.dm_channels.append({
+                "id": channel_id,
+                "type": 1,
+                "recipients": [{"id": OTHER_ID, "username": f"friend{i}"}],
+                "last_message_id": str(self.channels[channel_id]["ids"][-1]) if messages else None,
+            })
+        for g in range(guilds):
+            next_id[0] += 1
+            guild_id = str(next_id[0])
+            self.guilds.append({
+                "id": guild_id,
+                "name": f"guild{g}",
+                "owner_id": OTHER_ID,
+                "roles": [{"id": guild_id, "permissions": str(VIEW_AND_READ | (MANAGE_MESSAGES if manage else 0))}],
+            })
+            self.guild_channels[guild_id] = []
+            for c in range(guild_channels):
+                channel_id = make_channel(f"g{g}c{c}")
+                self.guild_channels[guild_id].append({"id": channel_id, "type": 0, "name": f"channel{c}", "guild_id": guild_id})
+                for message in self.channels[channel_id]["messages"].values():
+                    message["guild_id"] = guild_id
+            parent_id = self.guild_channels[guild_id][0]["id"] if guild_channels else None
+            self.guild_threads[guild_id] = []
+            for t in range(threads if parent_id else 0):
+                channel_id = make_channel(f"g{g}t{t}")
+                self.guild_threads[guild_id].append({"id": channel_id, "type": 11, "name": f"thread{t}", "guild_id": guild_id, "parent_id": parent_id})
+                for message in self.channels[channel_id]["messages"].values():
+                    message["guild_id"] = guild_id
+
+    def own_count(self):
+        return sum(
+            1 for channel in self.channels.values() for m in channel["messages"].values()
+            if m["author"]["id"] == USER_ID
+        )
+
+    def delay(self):
+        if self.latency:
+            time.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+
+    # returns (status, headers) the rate limiter decided on for this request
+    def rate_limit(self, bucket_name, major):
+        limit, window = self.limits[bucket_name]
+        now = time.monotonic()
+        with self.lock:
+            self.stats["requests"] += 1
+            self.global_sent = [t for t in self.global_sent if t > now - 1.0]
+            if len(self.global_sent) >= GLOBAL_LIMIT:
+                self.stats["rate_limited"] += 1
+                retry_after = self.global_sent[0] + 1.0 - now
+                return 429, {"X-RateLimit-Global": "true", "Retry-After": str(retry_after)}, {"retry_after": retry_after, "global": True}
+            self.global_sent.append(now)
+
+            bucket = self.buckets.get((bucket_name, major))
+            if bucket is None:
+                bucket = self.buckets[(bucket_name, major)] = MockBucket(limit, window)
+            if now >= bucket.reset_at:
+                bucket.remaining = limit
+                bucket.reset_at = now + window
+
+            headers = {
+                "X-RateLimit-Bucket": f"mock-{bucket_name}",
+                "X-RateLimit-Limit": str(limit),
+                "X-RateLimit-Reset-After": f"{bucket.reset_at - now:.3f}",
+            }
+            chaos = bucket_name == "delete" and self.random.random() < self.chaos
+            if bucket.remaining <= 0 or chaos:
+                self.stats["rate_limited"] += 1
+                headers["X-RateLimit-Remaining"] = "0"
+                retry_after = bucket.reset_at - now
+                return 429, headers, {"retry_after": retry_after, "global": False}
+            bucket.remaining -= 1
+            headers["X-RateLimit-Remaining"] = str(bucket.remaining)
+            return 200, headers, None
+
+    def list_messages(self, channel_id, query):
+        channel = self.channels[channel_id]
+        ids = channel["ids"]
+        limit = min(int(query.get("limit", 50)), 100)
+        with self.lock:
+            self.stats["pages"] += 1
+            if "after" in query:
+                start = bisect.bisect_right(ids, int(query["after"]))
+                picked = ids[start:start + limit]
+            else:
+                end = bisect.bisect_left(ids, int(query["before"])) if "before" in query else len(ids)
+                picked = ids[max(0, end - limit):end]
+            return [channel["messages"][i] for i in reversed(picked)]
+
+    def search(self, channel_ids, query):
+        author = query.get("author_id")
+        max_id = int(query["max_id"]) if "max_id" in query else None
+        min_id = int(query["min_id"]) if "min_id" in query else None
+        hits = []
+        with self.lock:
+            self.stats["searches"] += 1
+            for channel_id in channel_ids:
+                channel = self.channels[channel_id]
+                for message_id in reversed(channel["ids"]):
+                    if max_id is not None and message_id >= max_id:
+                        continue
+                    if min_id is not None and message_id <= min_id:
+                        break
+                    message = channel["messages"][message_id]
+                    if author is not None and message["author"]["id"] != author:
+                        continue
+                    if query.get("has") == "file" and not message["attachments"]:
+                        continue
+                    if query.get("has") == "link" and "https://" not in message["content"]:
+                        continue
+                    if "pinned" in query and message["pinned"] != (query["pinned"] == "true"):
+                        continue
+                    hits.append(message)
+            hits.sort(key=lambda m: -int(m["id"]))
+            return {"total_results": len(hits), "messages": [[dict(m, hit=True)] for m in hits[:25]]}
+
+    # like discord, all or nothing and only for messages younger than two weeks
+    def bulk_delete(self, channel_id, message_ids):
+        channel = self.channels.get(channel_id)
+        cutoff = time.time() * 1000 - BULK_DELETE_AGE
+        with self.lock:
+            if channel is None or not self.manage:
+                return 403
+            ids = [int(i) for i in message_ids]
+            if not 2 <= len(ids) <= 100 or any((i >> 22) + 1420070400000 < cutoff for i in ids):
+                return 400
+            for message_id in ids:
+                if message_id in channel["messages"]:
+                    del channel["messages"][message_id]
+                    channel["ids"].pop(bisect.bisect_left(channel["ids"], message_id))
+                    self.stats["deletes"] += 1
+            self.stats["bulk_deletes"] += 1
+            return 204
+
+    def delete_message(self, channel_id, message_id):
+        channel = self.channels.get(channel_id)
+        with self.lock:
+            if channel is None or int(message_id) not in channel["messages"]:
+                return 404
+            del channel["messages"][int(message_id)]
+            ids = channel["ids"]
+            ids.pop(bisect.bisect_left(ids, int(message_id)))
+            self.stats["deletes"] += 1
+            return 204
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status, body=None, headers=None):
+            payload = json.dumps(body).encode() if body is not None else b""
+            self.send_response(status)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            if body is not None:
+                self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def route(self):
+            url = urlparse(self.path)
+            path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            return path, query
+
+        def do_GET(self):
+            mock.delay()
+            path, query = self.route()
+            if path == "/users/@me":
+                return self.limited("default", "", lambda: {"id": USER_ID, "username": "me", "discriminator": "0"})
+            if path == "/users/@me/channels":
+                return self.limited("default", "", lambda: mock.dm_channels)
+            if path == "/users/@me/guilds":
+                return self.limited("default", "", lambda: mock.guilds)
+
+            match = re.fullmatch(r"/guilds/(\d+)", path)
+            guild = next((g for g in mock.guilds if match and g["id"] == match.group(1)), None)
+            if guild:
+                return self.limited("default", guild["id"], lambda: guild)
+            match = re.fullmatch(r"/users/@me/guilds/(\d+)/member", path)
+            if match and match.group(1) in mock.guild_channels:
+                return self.limited("default", "", lambda: {"user": {"id": USER_ID}, "roles": []})
+
+            match = re.fullmatch(r"/guilds/(\d+)/channels", path)
+            if match and match.group(1) in mock.guild_channels:
+                return self.limited("default", match.group(1), lambda: mock.guild_channels[match.group(1)])
+            match = re.fullmatch(r"/guilds/(\d+)/threads/active", path)
+            if match and match.group(1) in mock.guild_threads:
+                return self.limited("default", match.group(1), lambda: {"threads": mock.guild_threads[match.group(1)], "members": []})
+            match = re.fullmatch(r"/guilds/(\d+)/messages/search", path)
+            if match and match.group(1) in mock.guild_channels:
+                channels = mock.guild_channels[match.group(1)] + mock.guild_threads[match.group(1)]
+                channel_ids = [c["id"] for c in channels]
+                return self.limited("search", match.group(1), lambda: mock.search(channel_ids, query))
+            match = re.fullmatch(r"/channels/(\d+)/messages/search", path)
+            if match and match.group(1) in mock.channels:
+                return self.limited("search", match.group(1), lambda: mock.search([match.group(1)], query))
+            match = re.fullmatch(r"/channels/(\d+)/messages", path)
+            if match and match.group(1) in mock.channels:
+                return self.limited("messages", match.group(1), lambda: mock.list_messages(match.group(1), query))
+            self.reply(404, {"message": "Unknown route", "code": 0})
+
+        def do_DELETE(self):
+            mock.delay()
+            path, _ = self.route()
+            match = re.fullmatch(r"/channels/(\d+)/messages/(\d+)", path)
+            if not match:
+                return self.reply(404, {"message": "Unknown route", "code": 0})
+            status, headers, body = mock.rate_limit("delete", match.group(1))
+            if status == 429:
+                return self.reply(429, body, headers)
+            status = mock.delete_message(match.group(1), match.group(2))
+            if status == 404:
+                return self.reply(404, {"message": "Unknown Message", "code": 10008}, headers)
+            self.reply(204, None, headers)
+
+        def do_POST(self):
+            mock.delay()
+            path, _ = self.route()
+            match = re.fullmatch(r"/channels/(\d+)/messages/bulk-delete", path)
+            if not match:
+                return self.reply(404, {"message": "Unknown route", "code": 0})
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            status, headers, limited = mock.rate_limit("bulk", match.group(1))
+            if status == 429:
+                return self.reply(429, limited, headers)
+            status = mock.bulk_delete(match.group(1), body.get("messages", []))
+            if status != 204:
+                return self.reply(status, {"message": "Bulk delete refused", "code": 50034}, headers)
+            self.reply(204, None, headers)
+
+        def limited(self, bucket_name, major, produce):
+            status, headers, body = mock.rate_limit(bucket_name, major)
+            if status == 429:
+                return self.reply(429, body, headers)
+            self.reply(200, produce(), headers)
+
+    return Handler
+
+# starts the server on a background thread, returns it and the base url to point a client at
+def serve(mock, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(mock))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}{API_PREFIX}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the discord api")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dms", type=int, default=4)
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=0, help="active threads per guild")
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--span-days", type=int, default=3 * 365, help="how far back the history goes")
+    parser.add_argument("--manage", action="store_true", help="give the user manage messages in the guilds")
+    args = parser.parse_args()
+
+    mock = MockDiscord(dms=args.dms, guilds=args.guilds, threads=args.threads, messages=args.messages,
+                       latency=args.latency, span_days=args.span_days, manage=args.manage)
+    server, url = serve(mock, args.port)
+    print(f"mock discord running at {url}, ctrl+c to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
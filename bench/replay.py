@@ -0,0 +1,140 @@
+import json
+import time
+import argparse
+import threading
+from collections import defaultdict, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qsl
+from discord.trace import load_trace, query_key
+from discord.ratelimit import route_key
+from discord.metrics import endpoint_of
+from bench.mock_server import API_PREFIX
+
+# plays a trace recorded with $LAZER_RECORD / --record back as a local api. every request
+# gets the next recorded answer for the same method, path and query. cursors built from
+# the clock (time slices, date ranges) wont match exactly, those fall back to the next
+# unused answer for the same path
+class Replay:
+    def __init__(self, entries, realtime=False):
+        self.realtime = realtime  # sleep the recorded latency instead of answering right away
+        self.lock = threading.Lock()
+        self.exact = defaultdict(deque)   # (method, path, query) -> entries
+        self.by_path = defaultdict(deque) # (method, path) -> entries
+        self.used = set()
+        self.stats = {"requests": 0, "exact": 0, "fallback": 0, "missing": 0}
+        for i, entry in enumerate(entries):
+            self.exact[(entry["method"], entry["path"], entry["query"])].append((i, entry))
+            self.by_path[(entry["method"], entry["path"])].append((i, entry))
+
+    def take(self, queue):
+        while queue and queue[0][0] in self.used:
+            queue.popleft()
+        if not queue:
+            return None
+        i, entry = queue.popleft()
+        self.used.add(i)
+        return entry
+
+    def answer(self, method, path, query):
+        with self.lock:
+            self.stats["requests"] += 1
+            entry = self.take(self.exact[(method, path, query)])
+            if entry:
+                self.stats["exact"] += 1
+                return entry if self.realtime else self.instant(entry)
+            entry = self.take(self.by_path[(method, path)])
+            self.stats["fallback" if entry else "missing"] += 1
+            return entry if entry is None or self.realtime else self.instant(entry)
+
+    # same statuses and bucket shapes, but nothing tells the client to wait
+    def instant(self, entry):
+        headers = dict(entry["headers"])
+        for key in ["X-RateLimit-Reset-After", "Retry-After"]:
+            if key in headers:
+                headers[key] = "0"
+        body = entry["body"]
+        if isinstance(body, dict) and "retry_after" in body:
+            body = {**body, "retry_after": 0}
+        return {**entry, "headers": headers, "body": body}
+
+def make_handler(replay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def handle_any(self):
+            url = urlparse(self.path)
+            path = url.path[len(API_PREFIX):] if url.path.startswith(API_PREFIX) else url.path
+            if self.headers.get("Content-Length"):
+                self.rfile.read(int(self.headers["Content-Length"]))
+            entry = replay.answer(self.command, path, query_key(dict(parse_qsl(url.query))))
+            if entry is None:
+                return self.reply(404, {"message": "Not in trace", "code": 0}, {})
+            if replay.realtime:
+                time.sleep(entry["elapsed"])
+            self.reply(entry["status"], entry["body"], entry["headers"])
+
+        do_GET = do_POST = do_DELETE = do_PATCH = do_PUT = handle_any
+
+        def reply(self, status, body, headers):
+            payload = b""
+            if body is not None:
+                payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+            self.send_response(status)
+            for key, value in headers.items():
+                if key != "Content-Type":
+                    self.send_header(key, value)
+            if body is not None:
+                self.send_header("Content-Type", headers.get("Content-Type", "application/json"))
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    return Handler
+
+def serve(replay, port=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(replay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}{API_PREFIX}"
+
+# where a recorded run spent its time, per endpoint
+def summarize(entries):
+    endpoints = defaultdict(list)
+    limited = defaultdict(int)
+    for entry in entries:
+        endpoint = endpoint_of(route_key(entry["method"], entry["path"]))
+        endpoints[endpoint].append(entry["elapsed"])
+        if entry["status"] == 429:
+            limited[endpoint] += 1
+    span = entries[-1]["t"] - entries[0]["t"] if entries else 0
+    print(f"{len(entries)} requests over {span:.1f}s")
+    for endpoint, times in sorted(endpoints.items(), key=lambda e: -sum(e[1])):
+        times.sort()
+        p50 = times[len(times) // 2] * 1000
+        p95 = times[min(len(times) - 1, int(len(times) * 0.95))] * 1000
+        print(f"{len(times):>7}  {sum(times):>8.1f}s  p50 {p50:>6.0f}ms  p95 {p95:>6.0f}ms  429s {limited[endpoint]:>4}  {endpoint}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a recorded lazer trace as a local discord api")
+    parser.add_argument("trace")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--realtime", action="store_true", help="answer as slowly as discord did")
+    parser.add_argument("--summary", action="store_true", help="only print where the recorded run spent its time")
+    args = parser.parse_args()
+
+    header, entries = load_trace(args.trace)
+    if args.summary:
+        summarize(entries)
+    else:
+        replay = Replay(entries, args.realtime)
+        server, url = serve(replay, args.port)
+        print(f"replaying {len(entries)} requests at {url}, point lazer at it with --api-url, ctrl+c to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            server.shutdown()
+            print(replay.stats)
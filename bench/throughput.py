@@ -0,0 +1,77 @@
+import json
+import time
+import argparse
+from bench.mock_server import MockDiscord, serve, DEFAULT_LIMITS
+from discord.api import DiscordClient
+from workers.engine import DeletionEngine
+from workers import discovery
+
+# runs discovery and a full cleanup against the mock server and reports where the time went.
+# run from the repo root: python -m bench.throughput --dms 8 --messages 2000
+def run_benchmark(args):
+    limits = {"delete": (args.delete_limit, args.delete_window)}
+    mock = MockDiscord(
+        dms=args.dms, guilds=args.guilds, guild_channels=args.guild_channels, threads=args.threads, messages=args.messages,
+        own_ratio=args.own_ratio, latency=args.latency, jitter=args.latency / 4, limits=limits, chaos=args.chaos,
+        span_days=args.span_days, manage=args.manage
+    )
+    own = mock.own_count()
+    server, url = serve(mock)
+    client = DiscordClient("mock-token", base_url=url)
+
+    started = time.perf_counter()
+    channels = discovery.fetch_dms(client) + discovery.fetch_servers(client)
+    discovery_time = time.perf_counter() - started
+
+    engine = DeletionEngine(client, channels, {"use_search": not args.scan}, max_workers=args.workers)
+    errors = []
+    engine.on_error = lambda error, name: errors.append(f"{name}: {error}")
+    started = time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - started
+
+    server.shutdown()
+    client.close()
+    deleted = mock.stats["deletes"]
+    return {
+        "channels": len(channels),
+        "own_messages": own,
+        "deleted": deleted,
+        "left_over": mock.own_count(),
+        "discovery_seconds": round(discovery_time, 3),
+        "run_seconds": round(elapsed, 3),
+        "messages_per_sec": round(deleted / elapsed, 2) if elapsed else 0,
+        "pages_per_sec": round((mock.stats["pages"] + mock.stats["searches"]) / elapsed, 2) if elapsed else 0,
+        "requests": mock.stats["requests"],
+        "bulk_deletes": mock.stats["bulk_deletes"],
+        "rate_limited": mock.stats["rate_limited"],
+        "idle_seconds": round(client.limiter.waited, 3),  # summed over all worker threads
+        "errors": errors,
+    }
+
+if __name__ == "__main__":
+    delete_limit, delete_window = DEFAULT_LIMITS["delete"]
+    parser = argparse.ArgumentParser(description="Throughput benchmark against the mock discord api")
+    parser.add_argument("--dms", type=int, default=4)
+    parser.add_argument("--guilds", type=int, default=0)
+    parser.add_argument("--guild-channels", type=int, default=3)
+    parser.add_argument("--span-days", type=int, default=3 * 365, help="how far back the history goes")
+    parser.add_argument("--manage", action="store_true", help="give the user manage messages in the guilds")
+    parser.add_argument("--threads", type=int, default=0, help="active threads per guild")
+    parser.add_argument("--messages", type=int, default=500, help="messages per channel")
+    parser.add_argument("--own-ratio", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--delete-limit", type=int, default=delete_limit)
+    parser.add_argument("--delete-window", type=float, default=delete_window)
+    parser.add_argument("--chaos", type=float, default=0.0, help="chance of an unannounced 429 per delete")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--scan", action="store_true", help="page the history instead of using search")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>18}: {value}")
@@ -1,12 +1,111 @@
 from globals import *
+import os
+import copy
+from requests.adapters import HTTPAdapter
+from discord.ratelimit import RateLimiter, route_key
+from discord.metrics import Metrics
+from discord.retry import RetryPolicy
+from discord.control import RunControl
+from discord.trace import Recorder, RECORD_ENV
 
-def login(token):
-    response = requests.get(f"{BASE_URL}/users/@me", headers={"Authorization": token})
-    if response.status_code == 200:
-        context.token = token
-        context.user = json.loads(response.text, object_hook=lambda d: SimpleNamespace(**d)) # cache the user entirely
-        return True
-    
-    print("invalid token")
-    # TODO: add some message box or smn "you entered invalid token"
-    return False
\ No newline at end of file
+# (connect, read) in seconds, without these a dead connection hangs a worker forever
+DEFAULT_TIMEOUT = (5, 30)
+POOL_SIZE = 16
+
+# one of these is shared by every worker so connections are kept alive and the
+# rate limit state is the same for everyone talking to discord
+class DiscordClient:
+    def __init__(self, token, base_url=BASE_URL, timeout=DEFAULT_TIMEOUT, record=None):
+        self.token = token
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limiter = RateLimiter()
+        self.metrics = Metrics()
+        # pauses and stops everything waiting in here, a run gets its own through for_run
+        self.control = RunControl()
+        self.control.listen(self.limiter.wake)
+        self.retry = RetryPolicy(metrics=self.metrics, control=self.control)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"Authorization": token})
+        self.me = None
+        self.recorder = Recorder(record) if record else None
+
+    # a client for one run: same session, limiter, metrics, breaker and recorder, but its
+    # own control so pausing or stopping the run only holds back the run's requests
+    def for_run(self):
+        run = copy.copy(self)
+        run.control = RunControl()
+        run.control.listen(self.limiter.wake)
+        run.retry = RetryPolicy(metrics=self.metrics, breaker=self.retry.breaker, control=run.control)
+        return run
+
+    # rate limits, server errors and dropped connections are retried here, callers only
+    # see a response once the retry policy gave up on it
+    def request(self, method, path, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        route = route_key(method, path)
+        return self.retry.call(lambda: self.send(method, path, route, **kwargs))
+
+    # every attempt goes through the limiter so we send as soon as the bucket allows and never before
+    def send(self, method, path, route, **kwargs):
+        self.control.check()
+        self.metrics.add_wait(self.limiter.acquire(route, self.control))
+        started = time.monotonic()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", **kwargs)
+        except Exception:
+            self.limiter.release(route)
+            self.metrics.count("connection_errors")
+            raise
+        elapsed = time.monotonic() - started
+        self.metrics.observe(route, elapsed)
+        if self.recorder:
+            self.recorder.record(method, path, kwargs.get("params"), kwargs.get("json"), response, started, elapsed)
+        self.metrics.count("requests")
+        if response.status_code == 429:
+            self.metrics.count("rate_limited")
+        self.limiter.update(route, response)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    # /users/@me only gets asked once per login
+    def get_me(self, refresh=False):
+        if self.me is None or refresh:
+            response = self.get("/users/@me")
+            response.raise_for_status()
+            self.me = response.json()
+        return self.me
+
+    def close(self):
+        self.session.close()
+        if self.recorder:
+            self.recorder.close()
+
+# $LAZER_RECORD turns on recording for the gui too, see bench/replay.py to play it back
+def login(token, base_url=BASE_URL, record=None):
+    client = DiscordClient(token, base_url, record=record or os.environ.get(RECORD_ENV))
+    try:
+        me = client.get_me()
+    except Exception:
+        client.close()
+        print("invalid token")
+        # TODO: add some message box or smn "you entered invalid token"
+        return False
+
+    if context.client:
+        context.client.close()
+    context.client = client
+    context.token = token
+    context.user = json.loads(json.dumps(me), object_hook=lambda d: SimpleNamespace(**d)) # cache the user entirely
+    return True
@@ -0,0 +1,62 @@
+import time
+import threading
+
+class Cancelled(Exception):
+    def __init__(self):
+        super().__init__("Stopped")
+
+# pause/resume/stop for everything a run waits on. waits elsewhere (the limiter, the
+# breaker) register a wake function so they notice a stop right away instead of sleeping
+# out whatever they were waiting for
+class RunControl:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.stopped = False
+        self.paused = False
+        self.listeners = []
+
+    def listen(self, wake):
+        self.listeners.append(wake)
+
+    def notify(self):
+        with self.cond:
+            self.cond.notify_all()
+        # outside our lock, the listeners take their own
+        for wake in self.listeners:
+            wake()
+
+    def reset(self):
+        with self.cond:
+            self.stopped = False
+            self.paused = False
+
+    def stop(self):
+        self.stopped = True
+        self.notify()
+
+    def pause(self):
+        self.paused = True
+        self.notify()
+
+    def resume(self):
+        self.paused = False
+        self.notify()
+
+    # blocks while paused, raises Cancelled once stopped
+    def check(self):
+        with self.cond:
+            while self.paused and not self.stopped:
+                self.cond.wait()
+            if self.stopped:
+                raise Cancelled()
+
+    # time.sleep that a stop cuts short
+    def sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        with self.cond:
+            while not self.stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+        self.check()
@@ -0,0 +1,133 @@
+import re
+import json
+import time
+import threading
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# per endpoint, the channel/guild id would give every channel its own series
+def endpoint_of(route):
+    return re.sub(r"\d+", ":id", route)
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.total += seconds
+        self.count += 1
+
+    # rough percentile, the upper bound of the bucket it falls in
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= q * self.count:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else float("inf")
+        return float("inf")
+
+# everything a run spends its time on. the client feeds request latency and rate limit
+# waits, the engine counts what it did with the results
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.latency = defaultdict(Histogram)
+            self.counters = defaultdict(int)
+            self.rate_limit_wait = 0.0
+            self.pause = 0.0
+
+    def observe(self, route, seconds):
+        with self.lock:
+            self.latency[endpoint_of(route)].observe(seconds)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def add_wait(self, seconds):
+        with self.lock:
+            self.rate_limit_wait += seconds
+
+    # time requests sat behind an open circuit breaker
+    def add_pause(self, seconds):
+        with self.lock:
+            self.pause += seconds
+
+    def snapshot(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            endpoints = {
+                endpoint: {
+                    "count": h.count,
+                    "seconds": round(h.total, 3),
+                    "avg_ms": round(h.total / h.count * 1000, 1) if h.count else 0,
+                    "p50_ms": round(h.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 1),
+                    "buckets": dict(zip([str(b) for b in LATENCY_BUCKETS] + ["+Inf"], h.buckets)),
+                }
+                for endpoint, h in self.latency.items()
+            }
+            counters = dict(self.counters)
+            wait = self.rate_limit_wait
+            pause = self.pause
+
+        deleted = counters.get("deleted", 0)
+        return {
+            "elapsed_seconds": round(elapsed, 3),
+            "deletes_per_minute": round(deleted / elapsed * 60, 1) if elapsed else 0,
+            "rate_limit_wait_seconds": round(wait, 3),
+            "breaker_pause_seconds": round(pause, 3),
+            # time spent in flight, split by what the requests were for
+            "pagination_seconds": round(sum(e["seconds"] for k, e in endpoints.items() if k.startswith("GET")), 3),
+            "delete_seconds": round(sum(e["seconds"] for k, e in endpoints.items() if k.startswith("DELETE")), 3),
+            "counters": counters,
+            "endpoints": endpoints,
+        }
+
+    def to_prometheus(self):
+        snapshot = self.snapshot()
+        lines = [
+            "# TYPE lazer_request_seconds histogram",
+        ]
+        for endpoint, e in snapshot["endpoints"].items():
+            label = f'endpoint="{endpoint}"'
+            cumulative = 0
+            for bound, n in e["buckets"].items():
+                cumulative += n
+                lines.append(f'lazer_request_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"lazer_request_seconds_sum{{{label}}} {e['seconds']}")
+            lines.append(f"lazer_request_seconds_count{{{label}}} {e['count']}")
+        for name, value in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE lazer_{name}_total counter")
+            lines.append(f"lazer_{name}_total {value}")
+        lines.append("# TYPE lazer_rate_limit_wait_seconds_total counter")
+        lines.append(f"lazer_rate_limit_wait_seconds_total {snapshot['rate_limit_wait_seconds']}")
+        lines.append("# TYPE lazer_breaker_pause_seconds_total counter")
+        lines.append(f"lazer_breaker_pause_seconds_total {snapshot['breaker_pause_seconds']}")
+        lines.append("# TYPE lazer_run_seconds gauge")
+        lines.append(f"lazer_run_seconds {snapshot['elapsed_seconds']}")
+        return "\n".join(lines) + "\n"
+
+    # .prom gets the prometheus text format, anything else json
+    def write(self, path):
+        with open(path, "w") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), f, indent=2)
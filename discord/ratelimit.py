@@ -0,0 +1,146 @@
+import re
+import time
+import threading
+from collections import deque
+from discord.control import Cancelled
+
+# discord keys rate limits on the "major" parameter of a route, every other id is just noise
+MAJOR_PARAMS = ("channels", "guilds", "webhooks")
+GLOBAL_LIMIT = 50  # requests per second across the whole account
+GLOBAL_MARGIN = 0.05  # we count sends when they leave, discord when they arrive, jitter in between
+
+def route_key(method, path):
+    parts = path.split("?")[0].strip("/").split("/")
+    for i, part in enumerate(parts):
+        if part.isdigit() and (i == 0 or parts[i - 1] not in MAJOR_PARAMS):
+            parts[i] = ":id"
+    return f"{method.upper()} /" + "/".join(parts)
+
+def major_of(route):
+    match = re.search(r"/(?:channels|guilds|webhooks)/(\d+)", route)
+    return match.group(1) if match else ""
+
+class Bucket:
+    def __init__(self):
+        # until the first response tells us the real limit only one request may be in flight
+        self.limit = 1
+        self.remaining = 1
+        self.reset_at = None
+        self.inflight = 0
+
+class RateLimiter:
+    def __init__(self, global_limit=GLOBAL_LIMIT):
+        self.global_limit = global_limit
+        self.global_until = 0.0
+        self.sent = deque()
+        self.waited = 0.0  # total seconds requests spent held back, summed over all threads
+        self.routes = {}   # route -> bucket hash from X-RateLimit-Bucket
+        self.buckets = {}  # "hash:major" (or the route itself while the hash is unknown) -> Bucket
+        self.cond = threading.Condition()
+
+    def bucket_key(self, route):
+        bucket_hash = self.routes.get(route)
+        if bucket_hash is None:
+            return route
+        return f"{bucket_hash}:{major_of(route)}"
+
+    def bucket_for(self, route):
+        key = self.bucket_key(route)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Bucket()
+        return bucket
+
+    def global_wait(self, now):
+        window = 1.0 + GLOBAL_MARGIN
+        while self.sent and self.sent[0] <= now - window:
+            self.sent.popleft()
+        wait = self.global_until - now
+        if len(self.sent) >= self.global_limit:
+            wait = max(wait, self.sent[0] + window - now)
+        return wait
+
+    # blocks until the bucket for this route has room and reserves a slot in it,
+    # returns how long it had to wait. a stopped control gets the caller out right away, a
+    # paused one keeps it here even once the bucket has room
+    def acquire(self, route, control=None):
+        started = time.monotonic()
+        with self.cond:
+            while True:
+                if control and control.stopped:
+                    raise Cancelled()
+                if control and control.paused:
+                    self.cond.wait() # resume wakes us through the control's listener
+                    continue
+                now = time.monotonic()
+                wait = self.global_wait(now)
+                if wait <= 0:
+                    bucket = self.bucket_for(route)
+                    if bucket.reset_at is not None and now >= bucket.reset_at:
+                        bucket.remaining = bucket.limit
+                        bucket.reset_at = None
+                    if bucket.remaining > 0:
+                        bucket.remaining -= 1
+                        bucket.inflight += 1
+                        self.sent.append(now)
+                        self.waited += now - started
+                        return now - started
+                    # no reset known means a response is still in flight, it will wake us
+                    wait = bucket.reset_at - now if bucket.reset_at is not None else None
+                self.cond.wait(wait)
+
+    # feeds the headers of a finished request back into the bucket state
+    def update(self, route, response):
+        headers = response.headers
+        now = time.monotonic()
+        with self.cond:
+            bucket_hash = headers.get("X-RateLimit-Bucket")
+            if bucket_hash and self.routes.get(route) != bucket_hash:
+                pending = self.buckets.pop(self.bucket_key(route), None)
+                self.routes[route] = bucket_hash
+                key = self.bucket_key(route)
+                if key not in self.buckets and pending is not None:
+                    self.buckets[key] = pending
+
+            bucket = self.bucket_for(route)
+            bucket.inflight = max(0, bucket.inflight - 1)
+
+            if "X-RateLimit-Remaining" in headers:
+                remaining = int(headers["X-RateLimit-Remaining"])
+                bucket.limit = int(headers.get("X-RateLimit-Limit", remaining + 1))
+                # requests we already let through were not counted in this response yet
+                bucket.remaining = max(0, remaining - bucket.inflight)
+                bucket.reset_at = now + float(headers.get("X-RateLimit-Reset-After", 0))
+            elif bucket_hash is None and bucket.reset_at is None:
+                # route without limits, dont keep it serialized forever
+                bucket.limit = bucket.remaining = max(bucket.limit, bucket.inflight + 1, 5)
+            elif bucket.reset_at is None:
+                # a bucket but no counts, nothing tells us when the slot comes back so give it back now
+                bucket.remaining = min(bucket.limit, bucket.remaining + 1)
+
+            if response.status_code == 429:
+                try:
+                    body = response.json()
+                except ValueError:
+                    body = {}
+                retry_after = float(body.get("retry_after", headers.get("Retry-After", 1)))
+                if body.get("global") or headers.get("X-RateLimit-Global"):
+                    self.global_until = max(self.global_until, now + retry_after)
+                else:
+                    bucket.remaining = 0
+                    bucket.reset_at = max(bucket.reset_at or 0, now + retry_after)
+
+            self.cond.notify_all()
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    # the request never got a response (connection error etc), give the slot back
+    def release(self, route):
+        with self.cond:
+            bucket = self.bucket_for(route)
+            bucket.inflight = max(0, bucket.inflight - 1)
+            if bucket.reset_at is None:
+                bucket.remaining = min(bucket.limit, bucket.remaining + 1)
+            self.cond.notify_all()
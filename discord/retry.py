@@ -0,0 +1,128 @@
+import time
+import random
+import threading
+import requests
+from discord.control import RunControl, Cancelled
+
+MAX_ATTEMPTS = 5         # tries for a request failing with a server or connection error
+MAX_RATE_LIMITED = 10    # 429s a single request may run into, the limiter does the waiting
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+TRANSIENT_STATUSES = (500, 502, 503, 504)
+
+BREAKER_THRESHOLD = 5    # failed attempts in a row before everything is held back
+BREAKER_COOLDOWN = 30.0
+BREAKER_MAX_COOLDOWN = 300.0
+
+# while discord (or the connection to it) is down every request fails the same way, so
+# after a few failures in a row nobody sends anything until the cooldown has passed. each
+# time it trips again right away the cooldown doubles
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+        self.cond = threading.Condition()
+
+    def is_open(self):
+        return time.monotonic() < self.open_until
+
+    # blocks while the breaker is open, returns how long it had to wait
+    def wait(self, control=None):
+        started = time.monotonic()
+        with self.cond:
+            while True:
+                if control and control.stopped:
+                    raise Cancelled()
+                wait = self.open_until - time.monotonic()
+                if wait <= 0:
+                    return time.monotonic() - started
+                self.cond.wait(wait)
+
+    def wake(self):
+        with self.cond:
+            self.cond.notify_all()
+
+    def success(self):
+        with self.cond:
+            self.failures = 0
+            if not self.is_open():
+                self.cooldown = self.base_cooldown
+
+    # returns True when this failure tripped the breaker
+    def failure(self):
+        with self.cond:
+            self.failures += 1
+            if self.failures < self.threshold or self.is_open():
+                return False
+            self.failures = 0
+            self.trips += 1
+            self.open_until = time.monotonic() + self.cooldown
+            self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+            return True
+
+# decides what happens to a failed request. 429s are retried straight away since the
+# limiter already holds the next attempt back until the bucket resets, server errors and
+# dropped connections are retried with exponential backoff and full jitter
+class RetryPolicy:
+    def __init__(self, attempts=MAX_ATTEMPTS, rate_limited=MAX_RATE_LIMITED, base=BACKOFF_BASE, cap=BACKOFF_CAP,
+                 breaker=None, metrics=None, control=None):
+        self.attempts = attempts
+        self.rate_limited = rate_limited
+        self.base = base
+        self.cap = cap
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics
+        self.control = control or RunControl()
+        self.control.listen(self.breaker.wake)
+
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    def count(self, name):
+        if self.metrics:
+            self.metrics.count(name)
+
+    # send makes one attempt and returns the response. gives back the last response once
+    # the attempts are used up so the caller still decides what an error means, a dropped
+    # connection on the last attempt is raised
+    def call(self, send):
+        failures = 0
+        limited = 0
+        while True:
+            waited = self.breaker.wait(self.control)
+            if waited and self.metrics:
+                self.metrics.add_pause(waited)
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout):
+                failures += 1
+                if self.breaker.failure():
+                    self.count("breaker_trips")
+                if failures >= self.attempts:
+                    raise
+                self.count("retries")
+                self.control.sleep(self.backoff(failures))
+                continue
+
+            if response.status_code == 429:
+                limited += 1
+                if limited >= self.rate_limited:
+                    return response
+                self.count("retries")
+                continue
+            if response.status_code in TRANSIENT_STATUSES:
+                failures += 1
+                if self.breaker.failure():
+                    self.count("breaker_trips")
+                if failures >= self.attempts:
+                    return response
+                self.count("retries")
+                self.control.sleep(self.backoff(failures))
+                continue
+
+            self.breaker.success()
+            return response
@@ -0,0 +1,14 @@
+import time
+
+DISCORD_EPOCH = 1420070400000  # first second of 2015 in ms, snowflakes count from here
+
+# ms unix timestamp a snowflake was created at
+def timestamp_of(snowflake):
+    return (int(snowflake) >> 22) + DISCORD_EPOCH
+
+# smallest snowflake that could have been created at the given ms unix timestamp
+def from_timestamp(ms):
+    return str(max(0, int(ms) - DISCORD_EPOCH) << 22)
+
+def now_snowflake():
+    return from_timestamp(time.time() * 1000)
@@ -0,0 +1,71 @@
+import gzip
+import atexit
+import json
+import time
+import threading
+from urllib.parse import urlencode
+
+RECORD_ENV = "LAZER_RECORD"  # set to a path to record every request the client makes
+TRACE_VERSION = 1
+KEPT_HEADERS = (
+    "X-RateLimit-Bucket", "X-RateLimit-Limit", "X-RateLimit-Remaining", "X-RateLimit-Reset-After",
+    "X-RateLimit-Global", "X-RateLimit-Scope", "Retry-After", "Content-Type",
+)
+REDACTED_FIELDS = ("token", "email", "phone", "password")
+
+# same query, same key, whichever order the params were passed in
+def query_key(params):
+    return urlencode(sorted((k, str(v)) for k, v in (params or {}).items()))
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: "[redacted]" if k in REDACTED_FIELDS else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+# writes one gzipped json line per request: what was asked, what came back and how long
+# it took. request headers (so the token) are never written, response bodies go through redact
+class Recorder:
+    def __init__(self, path):
+        self.path = path
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        atexit.register(self.close) # the gui never closes its client, a gzip without its end cant be read
+        self.write({"version": TRACE_VERSION, "recorded": time.time()})
+
+    def write(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self.lock:
+            self.file.write(line)
+
+    def record(self, method, path, params, body, response, sent, elapsed):
+        try:
+            payload = redact(response.json()) if response.content else None
+        except ValueError:
+            payload = response.text
+        self.write({
+            "t": round(sent - self.started, 4),
+            "method": method,
+            "path": path,
+            "query": query_key(params),
+            "json": body,
+            "status": response.status_code,
+            "headers": {k: response.headers[k] for k in KEPT_HEADERS if k in response.headers},
+            "elapsed": round(elapsed, 4),
+            "body": payload,
+        })
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+
+# (header, entries) of a recorded trace
+def load_trace(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines or lines[0].get("version") != TRACE_VERSION:
+        raise ValueError(f"{path} is not a lazer trace")
+    return lines[0], lines[1:]
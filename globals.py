@@ -4,14 +4,9 @@ import time
 import base64
 import requests
 import json
+import queue
+import threading
 from types import SimpleNamespace
-from PyQt6.QtWidgets import (
-    QApplication, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QWidget,
-    QProgressBar, QHBoxLayout, QMessageBox, QListWidget, QListWidgetItem, 
-    QScrollArea, QGroupBox, QAbstractItemView, QDialogButtonBox
-)
-from PyQt6.QtGui import QFont, QPixmap
-from PyQt6.QtCore import Qt, QThread, pyqtSignal, QSize
 
 # define constants (this has to be done before importing the rest otherwise they cant access them)
 BASE_URL = "https://discord.com/api/v9"
@@ -30,14 +25,13 @@ QToolTip {
 class LazerContext:
     token = None
     user = {}
+    client = None
 
 # create instance of ZE DEADLY LAZERRRRRRRR
 context = LazerContext()
 
 # own modules (the order matters so they can access eachother)
+# nothing in here may import qt, the cli runs without it. gui stuff lives in gui/qt.py
 from discord import api
-from workers.fetcher import DataFetcher
-from workers.deletion import DeletionWorker
-from gui.channel_selector import ChannelSelector
-from gui.login import LoginWindow
-from gui.dashboard import MainWindow
\ No newline at end of file
+from storage.journal import Journal
+from storage.jobs import JobQueue
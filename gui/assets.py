@@ -0,0 +1,33 @@
+from gui.qt import *
+
+BACKGROUND_PATH = "assets/background.jpg"
+
+# every window puts the same background behind itself. the jpeg is decoded once per
+# process and scaled once per window size, later windows (and the login loop) just reuse
+# the pixmap instead of decoding the full image again and scaling it on every paint
+class AssetCache:
+    def __init__(self):
+        self.image = None
+        self.scaled = {}  # (path, width, height) -> QPixmap
+
+    def load(self, path):
+        if self.image is None or self.image[0] != path:
+            self.image = (path, QImage(path))
+        return self.image[1]
+
+    def pixmap(self, path, size):
+        key = (path, size.width(), size.height())
+        if key not in self.scaled:
+            image = self.load(path).scaled(
+                size, Qt.AspectRatioMode.IgnoreAspectRatio, Qt.TransformationMode.SmoothTransformation
+            )
+            self.scaled[key] = QPixmap.fromImage(image)
+        return self.scaled[key]
+
+assets = AssetCache()
+
+def set_background(widget, path=BACKGROUND_PATH):
+    background_label = QLabel(widget)
+    background_label.setPixmap(assets.pixmap(path, widget.size()))
+    background_label.setGeometry(widget.rect())
+    widget.setAutoFillBackground(True)
@@ -0,0 +1,135 @@
+from gui.qt import *
+
+SelectedRole = Qt.ItemDataRole.UserRole + 1
+SORT_RECENT, SORT_OLDEST, SORT_NAME = range(3)
+
+ROW_HEIGHT = 40
+SELECTED_COLOR = QColor(255, 255, 255, 153)
+HOVER_COLOR = QColor(255, 255, 255, 60)
+
+# plain list of channel dicts. filter and sort are done on a list of row indices in python,
+# going through a QSortFilterProxyModel would call data() a few hundred thousand times on
+# 10k+ rows. selection lives in here too so it survives rows being filtered out and back in
+class ChannelListModel(QAbstractListModel):
+    def __init__(self, items=None):
+        super().__init__()
+        self.items = []
+        self.keys = []  # lowercased names, built once per item list
+        self.rows = []  # indices into items that are visible, in display order
+        self.selected = set()
+        self.filter_text = ""
+        self.sort_mode = SORT_RECENT
+        self.set_items(items or [])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self.items[self.rows[index.row()]]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return item["name"]
+        if role == Qt.ItemDataRole.UserRole:
+            return item
+        if role == SelectedRole:
+            return item["id"] in self.selected
+        return None
+
+    def set_items(self, items):
+        self.items = list(items)
+        self.keys = [item["name"].lower() for item in self.items]
+        self.selected &= {item["id"] for item in self.items}
+        self.refresh()
+
+    # swaps in a fresh list from the api. unchanged lists cost nothing, renames only repaint
+    # their rows, anything else is a reset that keeps the selection
+    def apply(self, items):
+        old = {item["id"]: item for item in self.items}
+        if len(old) != len(items) or any(item["id"] not in old for item in items):
+            return self.set_items(items)
+
+        position = {item["id"]: i for i, item in enumerate(self.items)}
+        changed = []
+        for item in items:
+            i = position[item["id"]]
+            if self.items[i] != item:
+                if self.items[i].get("timestamp") != item.get("timestamp"):
+                    return self.set_items(items) # sort order may have moved
+                self.items[i] = item
+                self.keys[i] = item["name"].lower()
+                changed.append(i)
+        if changed:
+            visible = {row: n for n, row in enumerate(self.rows)}
+            for i in changed:
+                if i in visible:
+                    index = self.index(visible[i])
+                    self.dataChanged.emit(index, index)
+            if self.filter_text or self.sort_mode == SORT_NAME:
+                self.refresh()
+
+    def set_filter(self, text):
+        self.filter_text = text.lower()
+        self.refresh()
+
+    def set_sort(self, mode):
+        self.sort_mode = mode
+        self.refresh()
+
+    def refresh(self):
+        self.beginResetModel()
+        rows = range(len(self.items))
+        if self.filter_text:
+            rows = [i for i in rows if self.filter_text in self.keys[i]]
+        if self.sort_mode == SORT_NAME:
+            rows = sorted(rows, key=self.keys.__getitem__)
+        else:
+            rows = sorted(rows, key=lambda i: self.items[i].get("timestamp", 0), reverse=self.sort_mode == SORT_RECENT)
+        self.rows = rows
+        self.endResetModel()
+
+    def toggle(self, index):
+        item = self.items[self.rows[index.row()]]
+        if item["id"] in self.selected:
+            self.selected.remove(item["id"])
+        else:
+            self.selected.add(item["id"])
+        self.dataChanged.emit(index, index, [SelectedRole])
+
+    def clear_selection(self):
+        self.selected.clear()
+        self.refresh()
+
+    def selected_items(self):
+        return [item for item in self.items if item["id"] in self.selected]
+
+# paints the name straight onto the view, no widget per row so only visible rows cost anything
+class ChannelDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        painter.save()
+        if index.data(SelectedRole):
+            painter.fillRect(option.rect, SELECTED_COLOR)
+        elif option.state & QStyle.StateFlag.State_MouseOver:
+            painter.fillRect(option.rect, HOVER_COLOR)
+        text_rect = option.rect.adjusted(12, 0, -12, 0)
+        name = option.fontMetrics.elidedText(index.data(), Qt.TextElideMode.ElideRight, text_rect.width())
+        painter.setPen(QColor("black"))
+        painter.drawText(text_rect, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, name)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        return QSize(0, ROW_HEIGHT)
+
+# a header-less tree view instead of QListView, with uniform row heights its layout pass
+# over the model is noticeably cheaper on big lists and only visible rows get painted
+def make_channel_view(model, delegate):
+    view = QTreeView()
+    view.setModel(model)
+    view.setItemDelegate(delegate)
+    view.setUniformRowHeights(True)
+    view.setHeaderHidden(True)
+    view.setRootIsDecorated(False)
+    view.setMouseTracking(True)
+    view.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+    view.clicked.connect(model.toggle)
+    return view
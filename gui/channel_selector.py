@@ -1,11 +1,26 @@
-from globals import *
+from gui.qt import *
+from discord.snowflake import from_timestamp
+from workers.filters import is_empty
+
+HAS_CHOICES = [
+    ("Any message", {}),
+    ("With attachments", {"attachments": True}),
+    ("With links", {"links": True}),
+    ("With embeds", {"embeds": True}),
+    ("Without attachments", {"attachments": False}),
+    ("Without links", {"links": False}),
+]
+REFRESH_AFTER = 60  # seconds the lists are shown as they are when the dialog is opened again
 
 class ChannelSelector(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Select Channels")
-        self.setFixedSize(600, 400)
-        self.set_background_image()
+        self.setFixedSize(600, 480)
+        set_background(self)
+        self.dm_model = None
+        self.server_model = None
+        self.loaded = None  # when the last fetch went through, monotonic
         
         layout = QVBoxLayout(self)
         layout.setContentsMargins(20, 15, 20, 15)
@@ -34,17 +49,30 @@ class ChannelSelector(QDialog):
         self.fetcher = DataFetcher()
         self.fetcher.data_loaded.connect(self.populate_ui)
         self.fetcher.error_occurred.connect(self.show_error)
+        self.fetcher.finished.connect(self.fetched)
         self.fetcher.start()
 
-    def set_background_image(self):
-        pixmap = QPixmap("assets/background.jpg")
-        background_label = QLabel(self)
-        background_label.setPixmap(pixmap)
-        background_label.setGeometry(self.rect())
-        background_label.setScaledContents(True)
-        self.setAutoFillBackground(True)
+    # the dialog is built once and kept, every open starts from an empty selection and
+    # fetches the lists again unless they were just fetched
+    def refresh(self):
+        self.setWindowTitle("Select Channels")
+        if self.dm_model is not None:
+            for model in [self.dm_model, self.server_model]:
+                model.clear_selection()
+        stale = self.loaded is None or time.monotonic() - self.loaded > REFRESH_AFTER
+        if stale and not self.fetcher.isRunning():
+            self.fetcher.start()
+
+    def fetched(self):
+        # a fetch that failed before anything was shown is tried again on the next open
+        self.loaded = time.monotonic() if self.dm_model is not None else None
 
     def populate_ui(self, dms, servers):
+        # second call is the fresh list coming in after the cached one
+        if self.dm_model is not None:
+            self.dm_model.apply(dms)
+            self.server_model.apply(servers)
+            return
         self.loading_label.hide()
         
         content = QWidget()
@@ -70,49 +98,109 @@ class ChannelSelector(QDialog):
             }
         """)
         dm_layout = QVBoxLayout(dm_group)
-        self.dm_list = QListWidget()
-        self.dm_list.setStyleSheet("""
-            QListWidget {
+        list_style = """
+            QTreeView {
                 background-color: transparent;
                 border: none;
-                font-size: 14px;
+                font-size: 13px;
                 color: black;
             }
-            QListWidget::item:selected {
-                background-color: rgba(255, 255, 255, 0.6);
-            }
-        """)
-        self.dm_list.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
-        
-        for dm in dms:
-            item = QListWidgetItem()
-            item.setData(Qt.ItemDataRole.UserRole, dm)
-            item.setSizeHint(QSize(0, 40))
-            widget = self.create_list_item(dm["name"])
-            self.dm_list.addItem(item)
-            self.dm_list.setItemWidget(item, widget)
-        
+        """
+        self.delegate = ChannelDelegate()
+        self.dm_model = ChannelListModel(dms)
+        self.dm_list = make_channel_view(self.dm_model, self.delegate)
+        self.dm_list.setStyleSheet(list_style)
         dm_layout.addWidget(self.dm_list)
         
         server_group = QGroupBox("Servers")
         server_group.setStyleSheet(dm_group.styleSheet())
         server_layout = QVBoxLayout(server_group)
-        self.server_list = QListWidget()
-        self.server_list.setStyleSheet(self.dm_list.styleSheet())
-        self.server_list.setSelectionMode(QAbstractItemView.SelectionMode.MultiSelection)
-        
-        for server in servers:
-            item = QListWidgetItem()
-            item.setData(Qt.ItemDataRole.UserRole, server)
-            item.setSizeHint(QSize(0, 40))
-            widget = self.create_list_item(server["name"])
-            self.server_list.addItem(item)
-            self.server_list.setItemWidget(item, widget)
-        
+        self.server_model = ChannelListModel(servers)
+        self.server_list = make_channel_view(self.server_model, self.delegate)
+        self.server_list.setStyleSheet(list_style)
         server_layout.addWidget(self.server_list)
-        
+
+        filter_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search channels...")
+        self.search_input.setStyleSheet("""
+            background-color: rgba(255, 255, 255, 0.3);
+            color: black;
+            border: none;
+            padding: 6px 8px;
+            border-radius: 4px;
+        """)
+        self.search_input.textChanged.connect(self.apply_filter)
+        self.sort_mode = QComboBox()
+        self.sort_mode.addItems(["Recent first", "Oldest first", "Name"])
+        self.sort_mode.setStyleSheet(self.search_input.styleSheet())
+        self.sort_mode.currentIndexChanged.connect(self.apply_sort)
+        self.apply_sort()
+        filter_layout.addWidget(self.search_input)
+        filter_layout.addWidget(self.sort_mode)
+        content_layout.addLayout(filter_layout)
+
         content_layout.addWidget(dm_group)
         content_layout.addWidget(server_group)
+
+        # date range, turned into snowflake cursors so pages outside of it are never fetched
+        range_layout = QHBoxLayout()
+        range_layout.setContentsMargins(0, 10, 0, 0)
+
+        input_style = """
+            background-color: rgba(255, 255, 255, 0.3);
+            color: black;
+            border: none;
+            padding: 4px 8px;
+            border-radius: 4px;
+        """
+        self.range_mode = QComboBox()
+        self.range_mode.addItems(["All time", "Older than", "Between"])
+        self.days_input = QSpinBox()
+        self.days_input.setRange(1, 10000)
+        self.days_input.setValue(30)
+        self.days_input.setSuffix(" days")
+        self.from_date = QDateEdit(QDate.currentDate().addYears(-1))
+        self.to_date = QDateEdit(QDate.currentDate())
+        for widget in [self.range_mode, self.days_input, self.from_date, self.to_date]:
+            widget.setStyleSheet(input_style)
+        for date_edit in [self.from_date, self.to_date]:
+            date_edit.setCalendarPopup(True)
+            date_edit.setDisplayFormat("yyyy-MM-dd")
+        self.range_mode.currentIndexChanged.connect(self.update_range_inputs)
+        self.update_range_inputs()
+
+        range_layout.addWidget(self.range_mode)
+        range_layout.addWidget(self.days_input)
+        range_layout.addWidget(self.from_date)
+        range_layout.addWidget(self.to_date)
+        range_layout.addStretch()
+        self.dry_run = QCheckBox("Only count")
+        self.dry_run.setToolTip("Look for messages and estimate how long deleting them takes, without deleting anything")
+        self.dry_run.setStyleSheet("color: black;")
+        range_layout.addWidget(self.dry_run)
+        self.keep_copy = QCheckBox("Keep a copy")
+        self.keep_copy.setToolTip("Save every deleted message to a compressed archive, one file per channel")
+        self.keep_copy.setStyleSheet("color: black;")
+        range_layout.addWidget(self.keep_copy)
+        # the plan a count leaves behind only has ids, so deleting it can't keep a copy
+        self.dry_run.toggled.connect(self.update_keep_copy)
+        self.layout().addLayout(range_layout)
+
+        filter_row = QHBoxLayout()
+        filter_row.setContentsMargins(0, 6, 0, 0)
+        self.keywords_input = QLineEdit()
+        self.keywords_input.setPlaceholderText("Only messages containing... (comma separated)")
+        self.has_mode = QComboBox()
+        self.has_mode.addItems([label for label, _ in HAS_CHOICES])
+        self.skip_pinned = QCheckBox("Skip pinned")
+        self.skip_pinned.setStyleSheet("color: black;")
+        for widget in [self.keywords_input, self.has_mode]:
+            widget.setStyleSheet(input_style)
+        filter_row.addWidget(self.keywords_input, 1)
+        filter_row.addWidget(self.has_mode)
+        filter_row.addWidget(self.skip_pinned)
+        self.layout().addLayout(filter_row)
         
         button_layout = QHBoxLayout()
         button_layout.setContentsMargins(0, 10, 0, 0)
@@ -147,33 +235,58 @@ class ChannelSelector(QDialog):
         self.layout().addLayout(button_layout)
         self.scroll_area.show()
 
-    def create_list_item(self, name):
-        widget = QWidget()
-        widget.setStyleSheet("background-color: transparent;")
-        layout = QHBoxLayout(widget)
-        layout.setContentsMargins(12, 8, 12, 8)
-        
-        name_label = QLabel(name)
-        name_label.setStyleSheet("""
-            color: black;
-            font-size: 13px;
-            background-color: transparent;
-        """)
-        name_label.setWordWrap(True)
-        layout.addWidget(name_label)
-        
-        return widget
+    def update_keep_copy(self, counting):
+        if counting:
+            self.keep_copy.setChecked(False)
+        self.keep_copy.setEnabled(not counting)
+
+    def update_range_inputs(self):
+        mode = self.range_mode.currentIndex()
+        self.days_input.setVisible(mode == 1)
+        self.from_date.setVisible(mode == 2)
+        self.to_date.setVisible(mode == 2)
+
+    def apply_filter(self, text):
+        for model in [self.dm_model, self.server_model]:
+            model.set_filter(text)
+
+    def apply_sort(self):
+        for model in [self.dm_model, self.server_model]:
+            model.set_sort(self.sort_mode.currentIndex())
 
     def show_error(self, message):
+        if self.dm_model is not None:
+            # the cached list is still usable, just say it might be outdated
+            self.setWindowTitle("Select Channels (couldn't refresh, showing cached list)")
+            return
+        if not self.isVisible():
+            return # built ahead of time and not opened yet, opening it fetches again
         QMessageBox.critical(self, "Error", f"Failed to load data:\n{message}")
         self.reject()
 
     def get_selected(self):
-        selected = []
-        for i in range(self.dm_list.count()):
-            if self.dm_list.item(i).isSelected():
-                selected.append(self.dm_list.item(i).data(Qt.ItemDataRole.UserRole))
-        for i in range(self.server_list.count()):
-            if self.server_list.item(i).isSelected():
-                selected.append(self.server_list.item(i).data(Qt.ItemDataRole.UserRole))
-        return selected
\ No newline at end of file
+        return self.dm_model.selected_items() + self.server_model.selected_items()
+
+    def get_options(self):
+        after = before = None
+        mode = self.range_mode.currentIndex()
+        if mode == 1:
+            before = from_timestamp((time.time() - self.days_input.value() * 86400) * 1000)
+        elif mode == 2:
+            start = QDateTime(self.from_date.date(), QTime(0, 0)).toMSecsSinceEpoch()
+            end = QDateTime(self.to_date.date().addDays(1), QTime(0, 0)).toMSecsSinceEpoch()
+            after = str(int(from_timestamp(start)) - 1)
+            before = from_timestamp(end)
+        return {
+            "after": after, "before": before,
+            "dry_run": self.dry_run.isChecked(), "archive": self.keep_copy.isChecked(),
+            "filters": self.get_filters(),
+        }
+
+    def get_filters(self):
+        filters = {
+            "keywords": [k.strip() for k in self.keywords_input.text().split(",") if k.strip()],
+            "has": HAS_CHOICES[self.has_mode.currentIndex()][1],
+            "pinned": False if self.skip_pinned.isChecked() else None,
+        }
+        return None if is_empty(filters) else filters
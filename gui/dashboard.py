@@ -1,15 +1,38 @@
-from globals import *
+from gui.qt import *
+import os
+from storage.plan import Plan
+from storage.archive import ARCHIVE_DIR
+
+METRICS_PATH = "lazer_metrics.json"  # written at the end of every run
+PLAN_DIR = "lazer_plans"  # every "only count" run saves what it found to a file of its own in here
+
+def new_plan_path():
+    os.makedirs(PLAN_DIR, exist_ok=True)
+    return os.path.join(PLAN_DIR, f"plan-{int(time.time() * 1000)}.bin")
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    return f"{seconds // 60}m {seconds % 60:02d}s"
 
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
         self.worker = None
+        self.selector = None
+        self.busy = False  # a worker is going, new selections only get queued
+        self.plan_summary = None
+        self.journal = Journal()
+        self.jobs = JobQueue()
         self.setup_ui()
+        # once the window is up, so building it doesnt hold back the first paint
+        QTimer.singleShot(0, self.prepare_selector)
 
     def setup_ui(self):
         self.setWindowTitle("Lazer")
-        self.setFixedSize(500, 200)
-        self.set_background_image()
+        self.setFixedSize(500, 360)
+        set_background(self)
         
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 15, 20, 15)
@@ -39,6 +62,36 @@ class MainWindow(QWidget):
             }
         """)
 
+        self.stats_label = QLabel("")
+        self.stats_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.stats_label.setStyleSheet("""
+            color: black;
+            font-size: 11px;
+            background-color: rgba(255, 255, 255, 0.3);
+            border-radius: 5px;
+            padding: 4px;
+        """)
+        self.stats_label.hide()
+
+        # one line per queued, running or recently finished channel
+        self.job_list = QListWidget()
+        self.job_list.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.job_list.setStyleSheet("""
+            QListWidget {
+                color: black;
+                font-size: 11px;
+                background-color: rgba(255, 255, 255, 0.3);
+                border-radius: 5px;
+                padding: 4px;
+            }
+        """)
+        self.refresh_jobs()
+
+        # metrics are polled instead of pushed so the worker never waits on the ui
+        self.stats_timer = QTimer(self)
+        self.stats_timer.setInterval(1000)
+        self.stats_timer.timeout.connect(self.update_stats)
+
         self.select_btn = QPushButton("Select Channels")
         self.select_btn.setFixedSize(140, 40)
         self.select_btn.setStyleSheet("""
@@ -58,25 +111,41 @@ class MainWindow(QWidget):
         self.logout_btn.setStyleSheet(self.select_btn.styleSheet())
         self.logout_btn.clicked.connect(self.confirm_logout)
 
+        self.resume_btn = QPushButton("Resume Last Run")
+        self.resume_btn.setFixedSize(140, 40)
+        self.resume_btn.setStyleSheet(self.select_btn.styleSheet())
+        self.resume_btn.clicked.connect(self.resume_last_run)
+        self.refresh_resume()
+
+        # take the place of logout and resume while a run is going
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.setFixedSize(140, 40)
+        self.pause_btn.setStyleSheet(self.select_btn.styleSheet())
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.pause_btn.hide()
+
+        self.stop_btn = QPushButton("Stop")
+        self.stop_btn.setFixedSize(140, 40)
+        self.stop_btn.setStyleSheet(self.select_btn.styleSheet())
+        self.stop_btn.clicked.connect(self.stop_deletion)
+        self.stop_btn.hide()
+
         btn_layout = QHBoxLayout()
         btn_layout.addStretch()
         btn_layout.addWidget(self.logout_btn)
+        btn_layout.addWidget(self.resume_btn)
+        btn_layout.addWidget(self.pause_btn)
+        btn_layout.addWidget(self.stop_btn)
         btn_layout.addWidget(self.select_btn)
         btn_layout.addStretch()
 
         layout.addWidget(self.status_label)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.stats_label)
+        layout.addWidget(self.job_list)
         layout.addLayout(btn_layout)
         self.setLayout(layout)
 
-    def set_background_image(self):
-        pixmap = QPixmap("assets/background.jpg")
-        background_label = QLabel(self)
-        background_label.setPixmap(pixmap)
-        background_label.setGeometry(self.rect())
-        background_label.setScaledContents(True)
-        self.setAutoFillBackground(True)
-
     def confirm_logout(self):
         confirm = QMessageBox.question(
             self, "Confirm Logout",
@@ -86,37 +155,194 @@ class MainWindow(QWidget):
         if confirm == QMessageBox.StandardButton.Yes:
             self.close()
 
+    # one selector per session, built ahead of time so its lists are usually in before it's opened
+    def prepare_selector(self):
+        if self.selector is None:
+            self.selector = ChannelSelector()
+
     def show_selector(self):
-        selector = ChannelSelector()
-        if selector.exec() == QDialog.DialogCode.Accepted:
-            selected = selector.get_selected()
+        opened = time.perf_counter()
+        self.prepare_selector()
+        self.selector.refresh()
+        QTimer.singleShot(0, lambda: startup.mark("selector_open", opened))
+        if self.selector.exec() == QDialog.DialogCode.Accepted:
+            selected = self.selector.get_selected()
             if selected:
-                self.start_deletion(selected)
+                self.start_deletion(selected, self.selector.get_options())
+
+    def refresh_resume(self):
+        self.resume_btn.setEnabled(
+            self.jobs.pending(context.user.id) > 0 or self.journal.last_run(context.user.id) is not None
+        )
 
-    def start_deletion(self, channels):
-        if self.worker and self.worker.isRunning():
+    def refresh_jobs(self):
+        jobs = self.jobs.listing(context.user.id)
+        while self.job_list.count() > len(jobs):
+            self.job_list.takeItem(self.job_list.count() - 1)
+        for i, job in enumerate(jobs):
+            item = self.job_list.item(i)
+            if item is None:
+                item = QListWidgetItem()
+                self.job_list.addItem(item)
+            item.setText(f"{job['target']['name']} · {job['status']}")
+            item.setToolTip(job["error"] or "")
+        self.job_list.setVisible(bool(jobs))
+
+    # stopped jobs wait in the queue with their run, older runs come from the journal
+    def resume_last_run(self):
+        if self.jobs.pending(context.user.id):
+            self.start_next()
+            return
+        last = self.journal.last_run(context.user.id)
+        if last:
+            run_id, channels, options = last
+            self.start_deletion(channels, options, run_id)
+
+    # selections go into the job queue, a running worker takes them as soon as it has room
+    def start_deletion(self, channels, options=None, run_id=None):
+        options = {**(options or {}), "metrics_path": METRICS_PATH}
+        # every count gets its own file, so a plan run still waiting to be resumed keeps its plan
+        options["dry_run"] = new_plan_path() if options.get("dry_run") else None
+        if options.pop("archive", False):
+            options["archive_dir"] = ARCHIVE_DIR
+        added = self.jobs.add(context.user.id, channels, options, run_id)
+        self.refresh_jobs()
+        if self.busy:
+            skipped = len(channels) - added
+            self.status_label.setText(f"Queued {added} more" + (f", {skipped} were already queued" if skipped else ""))
             return
+        self.start_next()
 
-        self.worker = DeletionWorker(channels)
+    # a worker for the oldest queued job, it keeps taking the jobs after it that were
+    # queued with the same options
+    def start_next(self):
+        job = self.jobs.peek(context.user.id)
+        if job is None:
+            return False
+        options = job["options"]
+        self.dry_run = bool(options["dry_run"])
+        self.plan_summary = None
+        self.plan_path = options["dry_run"]
+        self.busy = True
+        self.worker = DeletionWorker([], options, self.journal, job["run_id"], self.jobs)
+        self.worker.plan_ready.connect(self.set_plan_summary)
         self.worker.update_progress.connect(self.update_progress)
+        self.worker.message_progress.connect(self.update_messages)
         self.worker.finished.connect(self.on_finished)
         self.worker.error_occurred.connect(self.show_error)
         self.worker.start()
 
-        self.select_btn.setEnabled(False)
-        self.select_btn.setText("Deleting...")
+        self.select_btn.setText("Add Channels")
+        self.stopping = False
+        self.logout_btn.hide()
+        self.resume_btn.hide()
+        self.pause_btn.setText("Pause")
+        self.pause_btn.show()
+        self.stop_btn.setEnabled(True)
+        self.stop_btn.show()
+        self.channels_done = f"0/{self.jobs.pending(context.user.id)} channels"
+        self.stats_label.setText("")
+        self.stats_label.show()
+        self.stats_timer.start()
+        return True
+
+    # the worker keeps its cursors and the client its rate limit state, nothing is lost
+    def toggle_pause(self):
+        if self.worker.engine.paused:
+            self.worker.resume()
+            self.pause_btn.setText("Pause")
+        else:
+            self.worker.pause()
+            self.pause_btn.setText("Continue")
+            self.status_label.setText(f"Paused · {self.channels_done}")
+
+    def stop_deletion(self):
+        self.stopping = True
+        self.stop_btn.setEnabled(False)
+        self.status_label.setText("Stopping...")
+        self.worker.stop()
+
+    def update_stats(self):
+        self.refresh_jobs()
+        stats = context.client.metrics.snapshot()
+        counters = stats["counters"]
+        delete = next((e for k, e in stats["endpoints"].items() if k.startswith("DELETE")), None)
+        latency = f"{delete['p50_ms']:.0f}/{delete['p95_ms']:.0f}ms" if delete else "-"
+        if self.worker.engine.paused:
+            self.stats_label.setText("paused, cursors and rate limits are kept")
+            return
+        if context.client.retry.breaker.is_open():
+            self.stats_label.setText("discord keeps failing, paused until it recovers...")
+            return
+        self.stats_label.setText(
+            f"{stats['deletes_per_minute']:.0f} del/min · delete p50/p95 {latency} · "
+            f"scanned {counters.get('scanned', 0)} · retries {counters.get('retries', 0)} · "
+            f"waited {stats['rate_limit_wait_seconds']:.0f}s · paging {stats['pagination_seconds']:.0f}s"
+        )
 
     def update_progress(self, current, total, name):
-        self.progress_bar.setValue(int((current / total) * 100))
-        self.status_label.setText(f"Cleaning {name}")
+        self.channels_done = f"{current}/{total} channels"
+
+    # arrives at most ~10 times a second, the engine coalesces per message updates
+    def update_messages(self, stats):
+        if self.worker.engine.paused or self.stopping:
+            return
+        if stats["total"]:
+            self.progress_bar.setValue(int(stats["deleted"] / stats["total"] * 100))
+        if self.dry_run:
+            self.status_label.setText(f"{stats['total']} messages found · {self.channels_done}")
+            return
+        eta = format_eta(stats["eta"]) if stats["eta"] is not None else "estimating..."
+        self.status_label.setText(f"{stats['deleted']}/{stats['total']} messages · ETA {eta} · {self.channels_done}")
 
-    def on_finished(self):
-        self.select_btn.setEnabled(True)
+    # keep_going is off after an error that ended the whole run, the queue would just hit it again
+    def on_finished(self, keep_going=True):
+        self.busy = False
+        self.stats_timer.stop()
+        self.stats_label.hide()
         self.select_btn.setText("Select Channels")
+        self.pause_btn.hide()
+        self.stop_btn.hide()
+        self.logout_btn.show()
+        self.resume_btn.show()
         self.progress_bar.setValue(0)
         self.status_label.setText(f"Welcome, {context.user.username}")
+        self.refresh_resume()
+        self.refresh_jobs()
+        if self.stopping:
+            QMessageBox.information(self, "Stopped", "Stopped. Use Resume Last Run to pick up where it left off.")
+            return
+        if not keep_going:
+            return
+        if self.plan_summary is not None:
+            self.offer_plan()
+            if not self.busy:
+                self.start_next() # whatever else was queued behind the dry run
+            return
+        if self.start_next():
+            return
         QMessageBox.information(self, "Complete", "Cleaning process finished!")
 
+    def set_plan_summary(self, summary):
+        self.plan_summary = summary
+
+    def offer_plan(self):
+        summary, self.plan_summary = self.plan_summary, None
+        lines = [f"{count} in {name}" for name, count in summary["channels"].items()]
+        answer = QMessageBox.question(
+            self, "Dry Run Finished",
+            f"Found {summary['messages']} messages:\n" + "\n".join(lines[:15]) +
+            ("\n..." if len(lines) > 15 else "") +
+            f"\n\nDeleting them takes about {format_eta(summary['estimate_seconds'])}. Delete them now?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if answer == QMessageBox.StandardButton.Yes:
+            plan = Plan.read(self.plan_path)
+            # the run only goes ahead on the file with exactly this plan in it
+            self.start_deletion(plan.targets, {"plan": self.plan_path, "plan_created": plan.created})
+
+    # a failed channel doesnt end the run, only "Global" errors do
     def show_error(self, error, context):
-        self.on_finished()
+        if context == "Global":
+            self.on_finished(keep_going=False)
         QMessageBox.critical(self, "Error", f"Error in {context}:\n{error}")
\ No newline at end of file
@@ -1,11 +1,11 @@
-from globals import *
+from gui.qt import *
 
 class LoginWindow(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Login - Lazer")
         self.setFixedSize(350, 150)
-        self.set_background_image()
+        set_background(self)
         
         layout = QVBoxLayout()
         layout.setContentsMargins(20, 15, 20, 15)
@@ -79,14 +79,6 @@ class LoginWindow(QDialog):
         if self.cached_token:
             context.token_input.setText(self.cached_token)
 
-    def set_background_image(self):
-        pixmap = QPixmap("assets/background.jpg")
-        background_label = QLabel(self)
-        background_label.setPixmap(pixmap)
-        background_label.setGeometry(self.rect())
-        background_label.setScaledContents(True)
-        self.setAutoFillBackground(True)
-
     def toggle_visibility(self):
         current = context.token_input.echoMode()
         new_mode = QLineEdit.EchoMode.Normal if current == QLineEdit.EchoMode.Password else QLineEdit.EchoMode.Password
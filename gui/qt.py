@@ -0,0 +1,24 @@
+# everything the gui needs on top of globals. only imported when the gui is launched,
+# so headless runs never pay for loading qt
+from globals import *
+from PyQt6.QtWidgets import (
+    QApplication, QDialog, QVBoxLayout, QLabel, QLineEdit, QPushButton, QWidget,
+    QProgressBar, QHBoxLayout, QMessageBox, QListWidget, QListWidgetItem, 
+    QScrollArea, QGroupBox, QAbstractItemView, QDialogButtonBox, QComboBox, QSpinBox, QDateEdit,
+    QTreeView, QStyledItemDelegate, QStyle, QCheckBox
+)
+from PyQt6.QtGui import QFont, QPixmap, QColor, QImage
+from PyQt6.QtCore import (
+    Qt, QThread, pyqtSignal, QSize, QDate, QDateTime, QTime, QTimer,
+    QAbstractListModel, QModelIndex
+)
+
+# own qt modules (the order matters so they can access eachother)
+from gui.timing import startup
+from gui.assets import set_background
+from workers.fetcher import DataFetcher
+from workers.deletion import DeletionWorker
+from gui.channel_model import ChannelListModel, ChannelDelegate, make_channel_view
+from gui.channel_selector import ChannelSelector
+from gui.login import LoginWindow
+from gui.dashboard import MainWindow
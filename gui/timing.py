@@ -0,0 +1,28 @@
+import os
+import json
+import time
+
+TIMING_ENV = "LAZER_TIMING"  # set to a path to append startup timings to it as json lines
+
+# how long the gui takes until something is on screen, counted from when this module was
+# imported (main.py does that before loading qt). every mark is kept, so reopening a
+# window shows up next to the first time
+class StartupTrace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.path = os.environ.get(TIMING_ENV)
+        self.marks = {}  # name -> seconds of every time it was marked
+
+    # seconds since `since` (a perf_counter value) or since launch
+    def mark(self, name, since=None):
+        seconds = time.perf_counter() - (self.started if since is None else since)
+        self.marks.setdefault(name, []).append(seconds)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"event": name, "seconds": round(seconds, 4), "time": time.time()}) + "\n")
+        return seconds
+
+    def first(self, name):
+        return name not in self.marks
+
+startup = StartupTrace()
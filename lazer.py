@@ -0,0 +1,160 @@
+import os
+import re
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+from workers.filters import is_empty, compile_filter
+
+# headless entry point, python -m lazer --help. everything heavy is imported after the
+# arguments are parsed and qt is never imported at all
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="lazer", description="Delete your own Discord messages without the gui")
+    parser.add_argument("--token", help="discord token, defaults to $LAZER_TOKEN or the gui's .token_cache")
+    parser.add_argument("--channel", action="append", default=[], metavar="ID", help="dm or channel id, can be repeated")
+    parser.add_argument("--guild", action="append", default=[], metavar="ID", help="server id, can be repeated")
+    parser.add_argument("--all-dms", action="store_true", help="clean every dm channel")
+    parser.add_argument("--older-than", type=int, metavar="DAYS", help="only messages older than this many days")
+    parser.add_argument("--after", metavar="YYYY-MM-DD", help="only messages from this day on")
+    parser.add_argument("--before", metavar="YYYY-MM-DD", help="only messages before this day")
+    filters = parser.add_argument_group("filters", "only delete messages that match all of these")
+    filters.add_argument("--match", metavar="REGEX", help="content matches this regex")
+    filters.add_argument("--keyword", action="append", default=[], help="content contains this word, can be repeated (any of them)")
+    filters.add_argument("--has", action="append", default=[], choices=["attachments", "embeds", "links"])
+    filters.add_argument("--without", action="append", default=[], choices=["attachments", "embeds", "links"])
+    filters.add_argument("--type", action="append", default=[], type=int, metavar="N", help="message type, 0 normal, 19 reply, can be repeated")
+    pinned = filters.add_mutually_exclusive_group()
+    pinned.add_argument("--pinned", action="store_const", const=True, dest="pinned", help="only pinned messages")
+    pinned.add_argument("--unpinned", action="store_const", const=False, dest="pinned", help="leave pinned messages alone")
+    parser.add_argument("--scan", action="store_true", help="page through the history instead of using search")
+    parser.add_argument("--slice-threshold", type=int, metavar="N",
+                        help="scan channels estimated above N messages in parallel time slices, 0 turns it off")
+    parser.add_argument("--workers", type=int, default=4, help="channels cleaned at the same time")
+    parser.add_argument("--resume", action="store_true", help="continue the last unfinished run")
+    parser.add_argument("--dry-run", metavar="FILE", help="only count what would be deleted and save the plan here")
+    parser.add_argument("--plan", metavar="FILE", help="delete what a --dry-run saved, without searching again")
+    parser.add_argument("--archive", metavar="DIR", help="keep a gzipped jsonl copy of every deleted message here, one file per channel")
+    parser.add_argument("--no-journal", action="store_true", help="dont record progress for resuming")
+    parser.add_argument("--metrics", metavar="FILE", help="write run metrics here at the end, .prom for prometheus text, else json")
+    parser.add_argument("--record", metavar="FILE", help="write a redacted trace of every request, play it back with bench/replay.py")
+    parser.add_argument("--api-url", help="talk to another api, e.g. the mock server in bench/")
+    parser.add_argument("--quiet", action="store_true")
+    return parser.parse_args(argv)
+
+def load_token(args):
+    if args.token:
+        return args.token
+    if os.environ.get("LAZER_TOKEN"):
+        return os.environ["LAZER_TOKEN"]
+    try:
+        with open(".token_cache", "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return ""
+
+def build_options(args, from_timestamp):
+    after = before = None
+    if args.older_than is not None:
+        before = from_timestamp((datetime.now() - timedelta(days=args.older_than)).timestamp() * 1000)
+    if args.before:
+        before = from_timestamp(datetime.strptime(args.before, "%Y-%m-%d").timestamp() * 1000)
+    if args.after:
+        after = str(int(from_timestamp(datetime.strptime(args.after, "%Y-%m-%d").timestamp() * 1000)) - 1)
+    options = {
+        "use_search": not args.scan, "after": after, "before": before,
+        "metrics_path": args.metrics, "dry_run": args.dry_run, "archive_dir": args.archive,
+    }
+    if args.slice_threshold is not None:
+        options["slice_threshold"] = args.slice_threshold or None
+    has = {**{kind: True for kind in args.has}, **{kind: False for kind in args.without}}
+    filters = {
+        "regex": args.match, "keywords": args.keyword, "has": has,
+        "types": args.type, "pinned": args.pinned,
+    }
+    options["filters"] = None if is_empty(filters) else filters
+    return options
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from globals import api, context, Journal, BASE_URL
+    from discord.snowflake import from_timestamp
+    from workers import discovery
+    from workers.engine import DeletionEngine
+    from storage.plan import Plan
+
+    def log(message):
+        if not args.quiet:
+            print(message, file=sys.stderr)
+
+    token = load_token(args)
+    if not token or not api.login(token, args.api_url or BASE_URL, args.record):
+        log("login failed, pass a valid --token")
+        return 2
+
+    journal = None if args.no_journal else Journal()
+    run_id = None
+    if args.resume:
+        last = journal.last_run(context.user.id) if journal else None
+        if last is None:
+            log("no unfinished run to resume")
+            return 1
+        run_id, channels, options = last
+        if args.metrics:
+            options["metrics_path"] = args.metrics
+        if args.archive:
+            options["archive_dir"] = args.archive
+    elif args.plan:
+        try:
+            plan = Plan.read(args.plan)
+        except (OSError, ValueError) as e:
+            log(f"cant read plan: {e}")
+            return 1
+        channels = plan.targets
+        # --resume refuses the file once it holds another plan
+        options = {"plan": args.plan, "plan_created": plan.created, "metrics_path": args.metrics, "archive_dir": args.archive}
+    else:
+        channels = [{"id": c, "name": f"channel {c}", "type": "dm"} for c in args.channel]
+        channels += [{"id": g, "name": f"server {g}", "type": "server"} for g in args.guild]
+        if args.all_dms:
+            channels += discovery.fetch_dms(context.client)
+        options = build_options(args, from_timestamp)
+        try:
+            compile_filter(options["filters"])
+        except (re.error, ValueError) as e:
+            log(f"bad filter: {e}")
+            return 1
+    if options.get("plan") and options.get("archive_dir"):
+        log("--archive needs the messages themselves, a plan only has their ids. run without --plan to keep a copy")
+        return 1
+    if not channels:
+        log("nothing selected, use --channel, --guild, --all-dms, --plan or --resume")
+        return 1
+
+    engine = DeletionEngine(context.client, channels, options, max_workers=args.workers, journal=journal, run_id=run_id)
+    errors = []
+    def on_error(error, name):
+        errors.append(name)
+        log(f"error in {name}: {error}")
+    engine.on_error = on_error
+    engine.on_progress = lambda done, total, name: log(f"[{done}/{total}] finished {name}")
+
+    started = time.monotonic()
+    try:
+        engine.run()
+    except KeyboardInterrupt:
+        engine.stop()
+        log("stopped, run again with --resume to continue")
+        return 130
+    log(f"done in {time.monotonic() - started:.1f}s")
+    if args.dry_run and not errors:
+        summary = engine.plan.summary(args.workers)
+        for name, count in summary["channels"].items():
+            print(f"{count:>8}  {name}")
+        print(f"{summary['messages']:>8}  messages, about {summary['estimate_seconds'] / 60:.0f} min to delete")
+        log(f"plan saved to {args.dry_run}, run it with --plan {args.dry_run}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,27 @@
-from globals import *
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    app.setStyleSheet(TOOLTIP_STYLE)
-
-    while True:
-        login_window = LoginWindow()
-        if login_window.exec() == QDialog.DialogCode.Accepted:
-            main_window = MainWindow()
-            main_window.show()
-
-            # Run the main window in its own loop
-            app.exec()
-
-            # If main window is closed, go back to login
-            continue
-        else:
-            break  # User closed or cancelled login
-
+from gui.timing import startup # before qt, so the startup trace counts loading it too
+from gui.qt import *
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    app.setStyleSheet(TOOLTIP_STYLE)
+
+    # built once, logging out just shows it again
+    login_window = LoginWindow()
+    while True:
+        if startup.first("first_window"):
+            QTimer.singleShot(0, lambda: startup.mark("first_window"))
+        if login_window.exec() == QDialog.DialogCode.Accepted:
+            opened = time.perf_counter()
+            main_window = MainWindow()
+            main_window.show()
+            QTimer.singleShot(0, lambda: startup.mark("main_window", opened))
+
+            # Run the main window in its own loop
+            app.exec()
+
+            # If main window is closed, go back to login
+            continue
+        else:
+            break  # User closed or cancelled login
+
     sys.exit()
\ No newline at end of file
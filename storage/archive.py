@@ -0,0 +1,62 @@
+import os
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from discord.snowflake import timestamp_of
+
+ARCHIVE_DIR = "lazer_archive"
+MAX_OPEN_FILES = 32  # big servers have hundreds of channels, close the least recently used
+
+# the parts of a message worth keeping once it is gone from discord
+def archive_record(message):
+    return {
+        "id": message["id"],
+        "channel_id": message["channel_id"],
+        "guild_id": message.get("guild_id"),
+        # plan runs only know ids, the snowflake still tells when it was sent
+        "timestamp": message.get("timestamp") or datetime.fromtimestamp(timestamp_of(message["id"]) / 1000, timezone.utc).isoformat(),
+        "edited_timestamp": message.get("edited_timestamp"),
+        "content": message.get("content"),
+        "attachments": [{"filename": a.get("filename"), "url": a.get("url")} for a in message.get("attachments", [])],
+        "embeds": message.get("embeds", []),
+    }
+
+# one gzipped jsonl file per channel, appended to as messages are deleted so memory use
+# doesnt grow with the history. every open appends a new gzip member, gzip readers see
+# the members of a resumed run as one stream
+class Archive:
+    def __init__(self, directory=ARCHIVE_DIR):
+        self.directory = directory
+        self.files = OrderedDict()  # channel id -> open gzip file, least recently used first
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path_of(self, channel_id):
+        return os.path.join(self.directory, f"{channel_id}.jsonl.gz")
+
+    def write(self, message):
+        line = json.dumps(archive_record(message), ensure_ascii=False) + "\n"
+        with self.lock:
+            f = self.files.get(message["channel_id"])
+            if f is None:
+                if len(self.files) >= MAX_OPEN_FILES:
+                    self.files.popitem(last=False)[1].close()
+                f = self.files[message["channel_id"]] = gzip.open(self.path_of(message["channel_id"]), "at", encoding="utf-8")
+            self.files.move_to_end(message["channel_id"])
+            f.write(line)
+
+    # sync flush of one channel's file (or all of them), what was written before is
+    # readable from disk after this even if the process dies before close
+    def flush(self, channel_id=None):
+        with self.lock:
+            for key, f in self.files.items():
+                if channel_id is None or key == channel_id:
+                    f.flush()
+
+    def close(self):
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files.clear()
@@ -0,0 +1,25 @@
+import os
+import json
+import time
+
+CACHE_DIR = ".lazer_cache"
+
+# last known dm/server lists per user, shown right away while a fresh copy is fetched
+def channel_cache_path(user_id):
+    return os.path.join(CACHE_DIR, f"{user_id}.json")
+
+def load_channels(user_id):
+    try:
+        with open(channel_cache_path(user_id), "r") as f:
+            data = json.load(f)
+        return data["dms"], data["servers"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+def save_channels(user_id, dms, servers):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = channel_cache_path(user_id)
+    # write then rename so a crash never leaves half a file behind
+    with open(path + ".tmp", "w") as f:
+        json.dump({"saved": time.time(), "dms": dms, "servers": servers}, f)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,115 @@
+import json
+import time
+import sqlite3
+import threading
+
+JOBS_PATH = ".lazer_jobs.db"
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+KEEP_FINISHED = 20  # done/failed jobs still listed, older ones are only in the db
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    target TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    run_id INTEGER,
+    error TEXT,
+    added REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (user_id, status, id);
+"""
+
+# channels/servers waiting to be cleaned, one job each. selections can be added while a
+# run is going, the engine takes the next job whenever one of its workers is free. a job
+# keeps the journal run it was taken by, so one that got stopped continues from its cursors
+class JobQueue:
+    def __init__(self, path=JOBS_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        # whatever was running when the app went down goes back in line
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, RUNNING))
+
+    def job(self, row):
+        return {
+            "id": row[0], "target": json.loads(row[1]), "options": json.loads(row[2]),
+            "status": row[3], "run_id": row[4], "error": row[5],
+        }
+
+    # queues every target that isnt queued or running already, returns how many were new
+    def add(self, user_id, targets, options, run_id=None):
+        added = 0
+        with self.lock, self.db:
+            for target in targets:
+                exists = self.db.execute(
+                    "SELECT 1 FROM jobs WHERE user_id = ? AND target_id = ? AND status IN (?, ?)",
+                    (user_id, target["id"], QUEUED, RUNNING)
+                ).fetchone()
+                if exists:
+                    continue
+                self.db.execute(
+                    "INSERT INTO jobs (user_id, target_id, target, options, status, run_id, added) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (user_id, target["id"], json.dumps(target), json.dumps(options), QUEUED, run_id, time.time())
+                )
+                added += 1
+        return added
+
+    # oldest queued job, or None
+    def peek(self, user_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, target, options, status, run_id, error FROM jobs WHERE user_id = ? AND status = ? ORDER BY id LIMIT 1",
+                (user_id, QUEUED)
+            ).fetchone()
+        return self.job(row) if row else None
+
+    # marks the oldest queued job running if accept(job) says it fits, jobs are never
+    # taken out of order so a selection with other options waits for the next run
+    def take(self, user_id, accept, run_id=None):
+        with self.lock, self.db:
+            row = self.db.execute(
+                "SELECT id, target, options, status, run_id, error FROM jobs WHERE user_id = ? AND status = ? ORDER BY id LIMIT 1",
+                (user_id, QUEUED)
+            ).fetchone()
+            if row is None or not accept(self.job(row)):
+                return None
+            self.db.execute("UPDATE jobs SET status = ?, run_id = ? WHERE id = ?", (RUNNING, run_id, row[0]))
+        return self.job(row)
+
+    def finish(self, job_id, error=None):
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET status = ?, error = ? WHERE id = ?", (FAILED if error else DONE, error, job_id))
+
+    # stopped half way, back in line with its run so the cursors still apply
+    def requeue(self, job_id):
+        with self.lock, self.db:
+            self.db.execute("UPDATE jobs SET status = ? WHERE id = ?", (QUEUED, job_id))
+
+    def pending(self, user_id):
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN (?, ?)", (user_id, QUEUED, RUNNING)
+            ).fetchone()[0]
+
+    # everything queued or running plus the last few finished ones, oldest first
+    def listing(self, user_id, finished=KEEP_FINISHED):
+        with self.lock:
+            rows = self.db.execute(
+                """SELECT id, target, options, status, run_id, error FROM jobs WHERE user_id = ? AND (
+                       status IN (?, ?) OR id IN (
+                           SELECT id FROM jobs WHERE user_id = ? AND status IN (?, ?) ORDER BY id DESC LIMIT ?
+                       )
+                   ) ORDER BY id""",
+                (user_id, QUEUED, RUNNING, user_id, DONE, FAILED, finished)
+            ).fetchall()
+        return [self.job(row) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,139 @@
+import json
+import time
+import sqlite3
+import threading
+
+JOURNAL_PATH = ".lazer_journal.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    started REAL NOT NULL,
+    channels TEXT NOT NULL,
+    options TEXT NOT NULL,
+    finished INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS cursors (
+    run_id INTEGER NOT NULL,
+    scope_id TEXT NOT NULL,
+    cursor TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (run_id, scope_id)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    user_id TEXT NOT NULL,
+    scope_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, scope_id)
+);
+CREATE TABLE IF NOT EXISTS deleted (
+    message_id TEXT PRIMARY KEY,
+    channel_id TEXT NOT NULL,
+    run_id INTEGER NOT NULL
+);
+"""
+
+# keeps track of how far a run got so a crash, expired token or stop doesnt throw the
+# progress away. a scope is whatever gets paged with one cursor (a channel or a guild search)
+class Journal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def start_run(self, user_id, channels, options):
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                "INSERT INTO runs (user_id, started, channels, options) VALUES (?, ?, ?, ?)",
+                (user_id, time.time(), json.dumps(channels), json.dumps(options))
+            )
+            return cursor.lastrowid
+
+    # channels a run took on after it started, so resuming it covers them too
+    def add_channels(self, run_id, channels):
+        with self.lock, self.db:
+            known = json.loads(self.db.execute("SELECT channels FROM runs WHERE id = ?", (run_id,)).fetchone()[0])
+            ids = {ch["id"] for ch in known}
+            known += [ch for ch in channels if ch["id"] not in ids]
+            self.db.execute("UPDATE runs SET channels = ? WHERE id = ?", (json.dumps(known), run_id))
+
+    def finish_run(self, run_id):
+        with self.lock, self.db:
+            self.db.execute("UPDATE runs SET finished = 1 WHERE id = ?", (run_id,))
+
+    def run_started(self, run_id):
+        with self.lock:
+            return self.db.execute("SELECT started FROM runs WHERE id = ?", (run_id,)).fetchone()[0]
+
+    # newest run of this user that never got to the end, or None
+    def last_run(self, user_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, channels, options FROM runs WHERE user_id = ? AND finished = 0 ORDER BY id DESC LIMIT 1",
+                (user_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1]), json.loads(row[2])
+
+    def get_cursor(self, run_id, scope_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT cursor, done FROM cursors WHERE run_id = ? AND scope_id = ?", (run_id, scope_id)
+            ).fetchone()
+        if row is None:
+            return None, False
+        return row[0], bool(row[1])
+
+    def save_cursor(self, run_id, scope_id, cursor):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cursors (run_id, scope_id, cursor, done) VALUES (?, ?, ?, 0)",
+                (run_id, scope_id, cursor)
+            )
+
+    def finish_scope(self, run_id, scope_id):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cursors (run_id, scope_id, cursor, done) VALUES (?, ?, NULL, 1)",
+                (run_id, scope_id)
+            )
+
+    def is_done(self, run_id, scope_id):
+        return self.get_cursor(run_id, scope_id)[1]
+
+    # everything of the user up to this snowflake is known to be gone from the scope
+    def get_watermark(self, user_id, scope_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT message_id FROM watermarks WHERE user_id = ? AND scope_id = ?", (user_id, scope_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, user_id, scope_id, message_id):
+        current = self.get_watermark(user_id, scope_id)
+        if current is not None and int(current) >= int(message_id):
+            return
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO watermarks (user_id, scope_id, message_id) VALUES (?, ?, ?)",
+                (user_id, scope_id, message_id)
+            )
+
+    def record_deleted(self, run_id, channel_id, message_id):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR IGNORE INTO deleted (message_id, channel_id, run_id) VALUES (?, ?, ?)",
+                (message_id, channel_id, run_id)
+            )
+
+    def is_deleted(self, message_id):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM deleted WHERE message_id = ?", (message_id,)).fetchone() is not None
+
+    def close(self):
+        with self.lock:
+            self.db.close()
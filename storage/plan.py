@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import struct
+import threading
+from array import array
+
+PLAN_MAGIC = b"LZPLAN01"
+# discord lets each channel delete about 5 messages every 5 seconds, the plan's estimate
+# assumes we get exactly that and nothing is lost to retries
+DELETE_RATE = 1.0
+
+# the messages a dry run found, grouped per selected channel/server and then per channel
+# they are in. on disk: magic, u32 header length, json header with the groups and their
+# sizes, then every message id as a little endian u64 in header order
+class Plan:
+    def __init__(self, user_id=None, targets=None, options=None, created=None):
+        self.user_id = user_id
+        self.targets = targets or []
+        self.options = options or {}
+        self.created = created or time.time()
+        self.groups = {}  # target id -> {channel id -> array of message ids}
+        self.lock = threading.Lock()
+
+    def add(self, target_id, channel_id, message_id):
+        with self.lock:
+            channels = self.groups.setdefault(target_id, {})
+            if channel_id not in channels:
+                channels[channel_id] = array("Q")
+            channels[channel_id].append(int(message_id))
+
+    # (channel id, ids newest first) for everything planned in a target
+    def channels_of(self, target_id):
+        with self.lock:
+            channels = self.groups.get(target_id, {})
+            return [(channel_id, sorted(ids, reverse=True)) for channel_id, ids in channels.items()]
+
+    def count(self, target_id=None):
+        with self.lock:
+            targets = [target_id] if target_id is not None else list(self.groups)
+            return sum(len(ids) for t in targets for ids in self.groups.get(t, {}).values())
+
+    # targets run side by side, a target's messages are deleted one after another
+    def estimate(self, workers=1):
+        counts = [self.count(target["id"]) for target in self.targets]
+        if not counts:
+            return 0.0
+        return max(max(counts), sum(counts) / max(workers, 1)) / DELETE_RATE
+
+    def summary(self, workers=1):
+        return {
+            "messages": self.count(),
+            "channels": {target["name"]: self.count(target["id"]) for target in self.targets},
+            "estimate_seconds": round(self.estimate(workers), 1),
+        }
+
+    def write(self, path):
+        with self.lock:
+            groups = {t: [[c, len(ids)] for c, ids in channels.items()] for t, channels in self.groups.items()}
+            body = array("Q")
+            for channels in self.groups.values():
+                for ids in channels.values():
+                    body.extend(sorted(ids, reverse=True))
+        if sys.byteorder == "big":
+            body.byteswap()
+        header = json.dumps({
+            "user_id": self.user_id,
+            "created": self.created,
+            "targets": self.targets,
+            "options": self.options,
+            "groups": groups,
+        }).encode()
+        with open(path + ".tmp", "wb") as f:
+            f.write(PLAN_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            body.tofile(f)
+        # a half written plan would delete only part of what it says
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def read(cls, path):
+        with open(path, "rb") as f:
+            if f.read(len(PLAN_MAGIC)) != PLAN_MAGIC:
+                raise ValueError(f"{path} is not a lazer plan")
+            size = struct.unpack("<I", f.read(4))[0]
+            header = json.loads(f.read(size))
+            body = array("Q")
+            body.frombytes(f.read())
+        if sys.byteorder == "big":
+            body.byteswap()
+
+        plan = cls(header["user_id"], header["targets"], header["options"], header["created"])
+        offset = 0
+        for target_id, channels in header["groups"].items():
+            plan.groups[target_id] = {}
+            for channel_id, size in channels:
+                plan.groups[target_id][channel_id] = body[offset:offset + size]
+                offset += size
+        return plan
@@ -0,0 +1,169 @@
+from globals import *
+from concurrent.futures import ThreadPoolExecutor
+
+TEXT_TYPES = [0, 5]          # text and announcement channels
+THREAD_PARENT_TYPES = [0, 5, 15, 16]  # forum and media channels only hold threads
+CRAWL_WORKERS = 4
+CRAWL_CACHE_TTL = 600  # seconds a crawled guild is trusted before it gets fetched again
+
+ADMINISTRATOR = 1 << 3
+VIEW_CHANNEL = 1 << 10
+MANAGE_MESSAGES = 1 << 13
+READ_MESSAGE_HISTORY = 1 << 16
+ALL_PERMISSIONS = (1 << 64) - 1
+
+# (what, user id, guild id) -> (crawled at, channels), what is "channels" or "crawl"
+crawl_cache = {}
+crawl_lock = threading.Lock()
+
+# discord's permission resolution: base from roles, then @everyone, role and member overwrites
+def compute_permissions(guild, member, user_id, overwrites):
+    if guild.get("owner_id") == user_id:
+        return ALL_PERMISSIONS
+    roles = {role["id"]: int(role["permissions"]) for role in guild.get("roles", [])}
+    permissions = roles.get(guild["id"], 0)
+    for role_id in member.get("roles", []):
+        permissions |= roles.get(role_id, 0)
+    if permissions & ADMINISTRATOR:
+        return ALL_PERMISSIONS
+
+    overwrites = {o["id"]: o for o in overwrites or []}
+    everyone = overwrites.get(guild["id"])
+    if everyone:
+        permissions = (permissions & ~int(everyone["deny"])) | int(everyone["allow"])
+    allow = deny = 0
+    for role_id in member.get("roles", []):
+        if role_id in overwrites:
+            allow |= int(overwrites[role_id]["allow"])
+            deny |= int(overwrites[role_id]["deny"])
+    permissions = (permissions & ~deny) | allow
+    own = overwrites.get(user_id)
+    if own:
+        permissions = (permissions & ~int(own["deny"])) | int(own["allow"])
+    return permissions
+
+def can_read(channel):
+    if channel["permissions"] is None:
+        return True # couldnt work it out, let the scan find out
+    needed = VIEW_CHANNEL | READ_MESSAGE_HISTORY
+    return channel["permissions"] & needed == needed
+
+# builds the full list of places a user's messages can be in a guild: text channels plus
+# active and archived threads (forum posts included), with the user's permissions in each
+class GuildCrawler:
+    def __init__(self, client, user_id, max_workers=CRAWL_WORKERS):
+        self.client = client
+        self.user_id = user_id
+        self.max_workers = max_workers
+
+    def cached(self, what, guild_id, fetch, refresh):
+        key = (what, self.user_id, guild_id)
+        with crawl_lock:
+            cached = crawl_cache.get(key)
+        if cached and not refresh and time.time() - cached[0] < CRAWL_CACHE_TTL:
+            return cached[1]
+
+        channels = fetch(guild_id)
+        with crawl_lock:
+            crawl_cache[key] = (time.time(), channels)
+        return channels
+
+    # text channels and threads
+    def channels(self, guild_id, refresh=False):
+        return self.cached("crawl", guild_id, lambda g: self.crawl(g, refresh), refresh)
+
+    # just the guild's channel list (any type) with our permissions in each, no threads.
+    # three requests, enough to tell where we could moderate at all
+    def guild_channels(self, guild_id, refresh=False):
+        return self.cached("channels", guild_id, self.fetch_channels, refresh)
+
+    def readable_channels(self, guild_id):
+        return [ch for ch in self.channels(guild_id) if can_read(ch)]
+
+    def fetch_channels(self, guild_id):
+        response = self.client.get(f"/guilds/{guild_id}/channels")
+        response.raise_for_status()
+        raw = response.json()
+        guild, member = self.fetch_membership(guild_id)
+
+        channels = []
+        for ch in raw:
+            permissions = None
+            if guild and member is not None:
+                permissions = compute_permissions(guild, member, self.user_id, ch.get("permission_overwrites"))
+            channels.append({
+                "id": ch["id"],
+                "name": ch.get("name", ch["id"]),
+                "type": ch["type"],
+                "parent_id": ch.get("parent_id"),
+                "permissions": permissions,
+            })
+        return channels
+
+    def crawl(self, guild_id, refresh=False):
+        by_id = {ch["id"]: ch for ch in self.guild_channels(guild_id, refresh)}
+        parents = [ch for ch in by_id.values() if ch["type"] in THREAD_PARENT_TYPES and can_read(ch)]
+        threads = self.fetch_active_threads(guild_id)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for archived in pool.map(self.fetch_archived_threads, parents):
+                threads.extend(archived)
+
+        result = [ch for ch in by_id.values() if ch["type"] in TEXT_TYPES]
+        seen = set()
+        for thread in threads:
+            if thread["id"] in seen:
+                continue
+            seen.add(thread["id"])
+            parent = by_id.get(thread.get("parent_id"), {})
+            result.append({
+                "id": thread["id"],
+                "name": f"{parent.get('name', '?')}/{thread.get('name', thread['id'])}",
+                "type": thread["type"],
+                "parent_id": thread.get("parent_id"),
+                # threads go by their parent's overwrites
+                "permissions": parent.get("permissions"),
+            })
+        return result
+
+    # guild roles and our member object, (None, None) if discord wont tell us
+    def fetch_membership(self, guild_id):
+        try:
+            guild = self.client.get(f"/guilds/{guild_id}")
+            member = self.client.get(f"/users/@me/guilds/{guild_id}/member")
+            if member.status_code != 200:
+                member = self.client.get(f"/guilds/{guild_id}/members/{self.user_id}")
+            if guild.status_code != 200 or member.status_code != 200:
+                return None, None
+            return guild.json(), member.json()
+        except Exception:
+            return None, None
+
+    def fetch_active_threads(self, guild_id):
+        response = self.client.get(f"/guilds/{guild_id}/threads/active")
+        if response.status_code != 200:
+            return []
+        return response.json().get("threads", [])
+
+    def fetch_archived_threads(self, parent):
+        threads = []
+        for path in [
+            f"/channels/{parent['id']}/threads/archived/public",
+            f"/channels/{parent['id']}/users/@me/threads/archived/private",
+        ]:
+            before = None
+            while True:
+                params = {"limit": 100}
+                if before:
+                    params["before"] = before
+                response = self.client.get(path, params=params)
+                if response.status_code != 200:
+                    break # no access or not supported for this channel type
+                data = response.json()
+                page = data.get("threads", [])
+                threads.extend(page)
+                if not data.get("has_more") or not page:
+                    break
+                # public archives page by archive time, private joined ones by thread id
+                last = page[-1]
+                before = last.get("thread_metadata", {}).get("archive_timestamp") if path.endswith("public") else last["id"]
+        return threads
@@ -1,101 +1,35 @@
-from globals import *
+from gui.qt import *
+from workers.engine import DeletionEngine
 
+# runs the engine off the ui thread and turns its hooks into signals
 class DeletionWorker(QThread):
     update_progress = pyqtSignal(int, int, str)
+    message_progress = pyqtSignal(dict)
     finished = pyqtSignal()
     error_occurred = pyqtSignal(str, str)
+    plan_ready = pyqtSignal(dict)  # dry runs only, the plan's summary right before finished
 
-    def __init__(self, channels):
+    def __init__(self, channels, options=None, journal=None, run_id=None, jobs=None):
         super().__init__()
-        self.channels = channels
-        self.running = True
-        self.headers = {"Authorization": context.token}
-        self.user_id = None
+        self.engine = DeletionEngine(context.client, channels, options, journal=journal, run_id=run_id, jobs=jobs)
+        self.engine.on_progress = self.update_progress.emit
+        self.engine.on_stats = self.message_progress.emit
+        self.engine.on_error = self.error_occurred.emit
 
     def run(self):
         try:
-            self.user_id = self.get_user_id()
-            total = len(self.channels)
-            
-            for idx, channel in enumerate(self.channels):
-                if not self.running:
-                    break
-                
-                try:
-                    if channel["type"] == "dm":
-                        self.process_dm(channel)
-                    elif channel["type"] == "server":
-                        self.process_server(channel)
-                    
-                    self.update_progress.emit(idx + 1, total, channel["name"])
-                except Exception as e:
-                    self.error_occurred.emit(str(e), channel["name"])
-            
+            self.engine.run()
+            if self.engine.options["dry_run"] and self.engine.running:
+                self.plan_ready.emit(self.engine.plan.summary(self.engine.max_workers))
             self.finished.emit()
-            
         except Exception as e:
             self.error_occurred.emit(str(e), "Global")
 
-    def get_user_id(self):
-        try:
-            return requests.get(f"{BASE_URL}/users/@me", headers=self.headers).json()["id"]
-        except:
-            raise ValueError("Failed to get user ID")
-
-    def process_dm(self, channel):
-        self.delete_messages(channel["id"], channel["name"])
-
-    def process_server(self, server):
-        try:
-            channels = requests.get(
-                f"{BASE_URL}/guilds/{server['id']}/channels",
-                headers=self.headers
-            ).json()
-            
-            for ch in channels:
-                if ch["type"] in [0, 5]:
-                    self.delete_messages(ch["id"], f"{server['name']}/#{ch['name']}")
-        except Exception as e:
-            raise Exception(f"Server error: {str(e)}")
+    def stop(self):
+        self.engine.stop()
 
-    def delete_messages(self, channel_id, context):
-        before = None
-        while self.running:
-            params = {"limit": 100}
-            if before:
-                params["before"] = before
-                
-            try:
-                messages = requests.get(
-                    f"{BASE_URL}/channels/{channel_id}/messages",
-                    headers=self.headers,
-                    params=params
-                ).json()
-                
-                for msg in messages:
-                    if msg["author"]["id"] == self.user_id:
-                        self.delete_message(msg["id"], channel_id)
-                        time.sleep(0.95)
-                
-                if len(messages) < 100:
-                    break
-                before = messages[-1]["id"]
-            except Exception as e:
-                raise Exception(f"Message deletion failed: {str(e)}")
+    def pause(self):
+        self.engine.pause()
 
-    def delete_message(self, message_id, channel_id):
-        try:
-            response = requests.delete(
-                f"{BASE_URL}/channels/{channel_id}/messages/{message_id}",
-                headers=self.headers
-            )
-            if response.status_code == 429:
-                retry_after = response.json().get('retry_after', 1)
-                time.sleep(retry_after)
-                self.delete_message(message_id, channel_id)
-            response.raise_for_status()
-        except Exception as e:
-            raise Exception(f"Delete failed: {str(e)}")
-
-    def stop(self):
-        self.running = False
\ No newline at end of file
+    def resume(self):
+        self.engine.resume()
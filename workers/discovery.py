@@ -0,0 +1,39 @@
+from globals import *
+from discord.snowflake import timestamp_of
+
+# turns the user's dm channels and guilds into the entries the engine works on. no qt in
+# here, the gui fetcher and the cli both use it
+
+def fetch_dms(client):
+    dms = []
+    response = client.get("/users/@me/channels")
+    response.raise_for_status()
+    channels = response.json()
+    for ch in channels:
+        if ch["type"] in [1, 3]:
+            recipients = [u["username"] for u in ch.get("recipients", [])]
+            # get timestamp for sorting
+            last_message_id = ch.get('last_message_id')
+            timestamp = timestamp_of(last_message_id or ch['id'])
+            dms.append({
+                "id": ch["id"],
+                "name": "DM with " + ", ".join(recipients),
+                "type": "dm",
+                "timestamp": timestamp
+            })
+    # forgot this lowkey
+    dms.sort(key=lambda x: x['timestamp'], reverse=True)
+    return dms
+
+def fetch_servers(client):
+    servers = []
+    response = client.get("/users/@me/guilds")
+    response.raise_for_status()
+    guilds = response.json()
+    for guild in guilds:
+        servers.append({
+            "id": guild["id"],
+            "name": guild["name"],
+            "type": "server"
+        })
+    return servers
@@ -0,0 +1,618 @@
+from globals import *
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from discord.snowflake import from_timestamp, timestamp_of, now_snowflake
+from workers.enumerators import scan_history, search_messages, search_or_scan, plan_pages, estimate_history
+from workers.crawler import GuildCrawler, MANAGE_MESSAGES
+from workers.progress import RunProgress
+from storage.plan import Plan
+from storage.archive import Archive
+from workers.filters import compile_filter, search_params
+
+PIPELINE_DEPTH = 1000  # max messages buffered between the scan and delete stages
+MAX_CHANNEL_WORKERS = 4  # channels cleaned at the same time, each one has its own delete bucket
+GUILD_SCAN_WORKERS = 4  # channels of one server scanned at the same time when search isnt there
+SLICE_THRESHOLD = 20000  # estimated messages above which a channel's history is scanned in slices
+SCAN_SLICES = 4
+DEFAULT_OPTIONS = {
+    "use_search": True,
+    "after": None,   # snowflake bounds of the date range, None means open ended
+    "before": None,
+    "metrics_path": None,  # .json or .prom file the run's metrics get written to at the end
+    "dry_run": None,  # plan file to write what would be deleted to, nothing gets deleted
+    "plan": None,     # plan file from a dry run to delete instead of looking for messages
+    "plan_created": None,  # when that plan was made, a plan file that was replaced since is refused
+    "slice_threshold": SLICE_THRESHOLD,  # None scans every channel in one piece
+    "archive_dir": None,  # keep a gzipped jsonl copy of every deleted message here, per channel
+    "filters": None,  # only delete what matches, see workers/filters.py for the spec
+}
+WATERMARK_SLACK = 60  # seconds the watermark stays behind the run start, covers clock skew
+BULK_DELETE_MAX = 100
+BULK_FLUSH_IDLE = 5.0  # seconds the scanner may stall before a partial bulk batch is sent anyway
+BULK_DELETE_AGE = (14 * 86400 - 3600) * 1000  # discord refuses anything older than two weeks, keep an hour of margin
+
+def slice_scope(channel_id, index):
+    return f"{channel_id}/{index}"
+
+# marks the point in the queue where everything of a page before it has been handled
+class Checkpoint:
+    def __init__(self, scope_id, cursor):
+        self.scope_id = scope_id
+        self.cursor = cursor
+
+# the deletion logic itself, no qt in here so it can be driven by anything. the hooks
+# get called from the engine's threads
+class DeletionEngine:
+    def __init__(self, client, channels, options=None, max_workers=MAX_CHANNEL_WORKERS, journal=None, run_id=None, jobs=None):
+        # own control on the shared session and limiter, pausing or stopping the run leaves
+        # everything else on the client (the selector's channel lists) alone
+        self.client = client.for_run()
+        self.channels = list(channels)
+        self.waiting = list(channels)
+        # JobQueue to keep taking channels from as workers free up, only jobs queued with
+        # the same options fit into this run
+        self.jobs = jobs
+        self.taken = {}  # channel id -> id of the job it came from
+        self.options = {**DEFAULT_OPTIONS, **(options or {})}
+        self.use_search = self.options["use_search"]
+        # the date range is part of the predicate too, search results at the edges dont always respect it
+        spec = self.options["filters"]
+        if spec:
+            spec = {**spec, "after": self.options["after"], "before": self.options["before"]}
+        self.matches = compile_filter(spec)
+        self.max_workers = max_workers
+        # a dry run changes nothing, so there is nothing to resume either
+        self.journal = journal if not self.options["dry_run"] else None
+        self.run_id = run_id
+        self.mark = None
+        self.running = True
+        self.user_id = None
+        self.crawler = None
+        self.plan = None
+        self.archive = None
+        self.bulk = {}  # guild id -> ids of its channels we may bulk delete in
+        self.bulk_lock = threading.Lock()
+        # channels paged through their history in this run. only those get a watermark, the
+        # search index can lag behind by much more than WATERMARK_SLACK and a search that
+        # missed a fresh message would put it below the watermark for good
+        self.history_scopes = set()
+        self.progress = RunProgress()
+
+        self.on_progress = lambda done, total, name: None
+        self.on_stats = lambda stats: None  # throttled, gets RunProgress snapshots
+        self.on_error = lambda error, name: None
+
+    # discord limits deletes per channel, so channels in different buckets run side by side
+    # and only meet in the shared limiter for the global limit
+    def run(self):
+        self.client.metrics.reset()
+        self.user_id = self.get_user_id()
+        self.crawler = GuildCrawler(self.client, self.user_id)
+        if self.options["dry_run"]:
+            range_options = {k: self.options[k] for k in ["after", "before"]}
+            self.plan = Plan(self.user_id, list(self.channels), range_options)
+        elif self.options["plan"]:
+            self.plan = Plan.read(self.options["plan"])
+            if self.plan.user_id != self.user_id:
+                raise ValueError("Plan was made for another account")
+            if self.options["plan_created"] is not None and self.plan.created != self.options["plan_created"]:
+                raise ValueError(f"{self.options['plan']} was replaced by another plan since this run started")
+            for target in self.plan.targets:
+                for channel_id, ids in self.plan.channels_of(target["id"]):
+                    self.progress.estimate(channel_id, len(ids))
+        if self.options["archive_dir"] and self.options["plan"]:
+            # a plan only has message ids, the copy would have no content in it
+            raise ValueError("Can't keep a copy of a plan's messages, delete without the plan to keep one")
+        if self.options["archive_dir"] and not self.options["dry_run"]:
+            self.archive = Archive(self.options["archive_dir"])
+        if self.journal and self.run_id is None:
+            self.run_id = self.journal.start_run(self.user_id, self.channels, self.options)
+        if self.journal:
+            # a finished pass has cleaned everything older than when its run started
+            started = self.journal.run_started(self.run_id)
+            self.mark = from_timestamp((started - WATERMARK_SLACK) * 1000)
+        done = 0
+        failed = False
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = {}
+
+                # keeps every worker busy, jobs queued while we run get picked up here
+                def fill():
+                    while len(futures) < self.max_workers and self.running:
+                        channel = self.next_channel()
+                        if channel is None:
+                            break
+                        futures[pool.submit(self.process_channel, channel)] = channel
+
+                try:
+                    fill()
+                    while futures:
+                        finished, _ = wait(futures, timeout=0.5, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            channel = futures.pop(future)
+                            done += 1
+                            try:
+                                future.result()
+                                self.finish_job(channel)
+                                self.on_progress(done, len(self.channels), channel["name"])
+                            except Exception as e:
+                                if not self.running:
+                                    continue # cut short by stop, not a failure
+                                failed = True
+                                self.finish_job(channel, str(e))
+                                self.on_error(str(e), channel["name"])
+                        fill()
+                except BaseException:
+                    self.stop() # ctrl+c in the cli, let the channel threads wind down
+                    raise
+        finally:
+            # only once every channel thread is done writing to it
+            if self.archive:
+                self.archive.close()
+            # whatever got stopped half way goes back in line for the next run
+            for job_id in self.taken.values():
+                self.jobs.requeue(job_id)
+            self.taken.clear()
+        self.report(force=True)
+
+        if self.options["dry_run"] and self.running:
+            self.plan.write(self.options["dry_run"])
+        if self.options["metrics_path"]:
+            self.client.metrics.write(self.options["metrics_path"])
+
+        # stopped or broken runs stay open so they can be resumed
+        if self.journal and self.running and not failed:
+            self.journal.finish_run(self.run_id)
+
+    # the channels we were started with first, then whatever the job queue has that fits
+    def next_channel(self):
+        if self.waiting:
+            return self.waiting.pop(0)
+        if self.jobs is None:
+            return None
+        job = self.jobs.take(self.user_id, self.fits, self.run_id)
+        if job is None:
+            return None
+        channel = job["target"]
+        self.taken[channel["id"]] = job["id"]
+        self.channels.append(channel)
+        if self.journal:
+            self.journal.add_channels(self.run_id, [channel])
+        if self.options["dry_run"]:
+            self.plan.targets.append(channel)
+        return channel
+
+    # a job can join this run if it was queued with the same options and, when a stopped
+    # run took it before, that run is this one
+    def fits(self, job):
+        return {**DEFAULT_OPTIONS, **job["options"]} == self.options and job["run_id"] in (None, self.run_id)
+
+    def finish_job(self, channel, error=None):
+        job_id = self.taken.get(channel["id"])
+        if job_id is None or not self.running:
+            return # stopped jobs are requeued at the end of the run
+        del self.taken[channel["id"]]
+        self.jobs.finish(job_id, error)
+
+    def process_channel(self, channel):
+        if not self.running:
+            return
+        if self.resume_cursor(channel["id"])[1]:
+            return # already cleaned in an earlier attempt of this run
+        if self.options["plan"]:
+            guild_id = channel["id"] if channel["type"] == "server" else None
+            self.delete_messages(plan_pages(self.plan, channel["id"], self.resume_cursor), channel["name"], guild_id)
+        elif channel["type"] == "dm":
+            self.process_dm(channel)
+        elif channel["type"] == "server":
+            self.process_server(channel)
+        if self.journal and self.running:
+            self.journal.finish_scope(self.run_id, channel["id"])
+
+    # (cursor, done) this run left off at for a scope
+    def resume_cursor(self, scope_id):
+        if not self.journal:
+            return None, False
+        return self.journal.get_cursor(self.run_id, scope_id)
+
+    # newest message id worth looking at, where this run left off or the end of the date range
+    def ceiling(self, scope_id):
+        return self.resume_cursor(scope_id)[0] or self.options["before"]
+
+    # oldest message id worth looking at, the start of the date range or the point a
+    # previous full pass got down to
+    def floor(self, scope_id):
+        bounds = [self.options["after"]]
+        if self.journal:
+            bounds.append(self.journal.get_watermark(self.user_id, scope_id))
+        bounds = [int(b) for b in bounds if b]
+        return str(max(bounds)) if bounds else None
+
+    # watermarks only mean something when the whole history was covered, a plan only
+    # covers what was there when it was made and a filtered run leaves the rest behind
+    def covers_everything(self):
+        return (
+            self.options["after"] is None and self.options["before"] is None
+            and not self.options["plan"] and self.matches is None
+        )
+
+    def get_user_id(self):
+        try:
+            return self.client.get_me()["id"]
+        except:
+            raise ValueError("Failed to get user ID")
+
+    def process_dm(self, channel):
+        before = self.ceiling(channel["id"])
+        after = self.floor(channel["id"])
+        if self.use_search:
+            pages = search_or_scan(
+                search_messages(
+                    self.client, "channels", channel["id"], self.user_id, before, after,
+                    self.progress.estimate, search_params(self.options["filters"])
+                ),
+                lambda: self.scan_channel(channel["id"])
+            )
+        else:
+            pages = self.scan_channel(channel["id"])
+        self.consume(pages, channel)
+
+    def process_server(self, server):
+        try:
+            if self.use_search:
+                pages = search_or_scan(
+                    search_messages(
+                        self.client, "guilds", server["id"], self.user_id,
+                        self.ceiling(server["id"]), self.floor(server["id"]), self.progress.estimate,
+                        search_params(self.options["filters"])
+                    ),
+                    lambda: self.scan_server(server)
+                )
+            else:
+                pages = self.scan_server(server)
+            self.consume(pages, server)
+        except Exception as e:
+            raise Exception(f"Server error: {str(e)}")
+
+    # every text channel and thread we can read, scanned a few at a time. the pages of all
+    # of them come out of the one generator so they share the server's delete stage
+    def scan_server(self, server):
+        channels = [
+            ch for ch in self.crawler.readable_channels(server["id"])
+            if not self.resume_cursor(ch["id"])[1]
+        ]
+        yield from self.merge_scans([lambda ch=ch: self.scan_readable(ch["id"]) for ch in channels], GUILD_SCAN_WORKERS)
+
+    def scan_readable(self, channel_id):
+        try:
+            yield from self.scan_channel(channel_id)
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 403:
+                raise
+            self.client.metrics.count("forbidden_channels") # permissions were off, nothing we can do there
+
+    # a channel whose history looks big gets cut into time slices that are paged side by
+    # side, otherwise it is one plain backwards scan
+    def scan_channel(self, channel_id):
+        self.history_scopes.add(channel_id)
+        before = self.ceiling(channel_id)
+        after = self.floor(channel_id)
+        threshold = self.options["slice_threshold"]
+        first_page = None
+        # a channel a previous attempt already scanned plainly stays that way
+        if threshold and not self.resume_cursor(channel_id)[0]:
+            estimate, first_page = estimate_history(self.client, channel_id, before, after)
+            if estimate > threshold:
+                yield from self.scan_slices(channel_id, before, after)
+                return
+        yield from scan_history(self.client, channel_id, self.user_id, before, after, first_page=first_page)
+
+    # the slices only depend on the range and the channel's slice_top, so a resumed run cuts the
+    # channel the same way and every slice continues from its own cursor
+    def scan_slices(self, channel_id, before, after):
+        low = int(after) if after else int(channel_id)
+        high = int(before) if before else self.slice_top(channel_id)
+        start, end = timestamp_of(low), timestamp_of(high)
+        cuts = [int(from_timestamp(start + (end - start) * i / SCAN_SLICES)) for i in range(1, SCAN_SLICES)]
+        # (after, before) of each slice, both exclusive
+        ranges = list(zip([low] + [c - 1 for c in cuts], cuts + [high]))
+
+        def scan(i, slice_after, slice_before):
+            scope = slice_scope(channel_id, i)
+            cursor, done = self.resume_cursor(scope)
+            if done:
+                return
+            yield from scan_history(self.client, channel_id, self.user_id, cursor or str(slice_before), str(slice_after), scope)
+
+        self.client.metrics.count("sliced_channels")
+        yield from self.merge_scans([lambda r=r: scan(*r) for r in [(i, a, b) for i, (a, b) in enumerate(ranges)]], SCAN_SLICES)
+        if self.running:
+            yield [], channel_id, None # all slices are through, so is the channel
+
+    # newest end of a sliced channel without a date range: when its scan first started, not
+    # when the run did, so channels taken on hours into a run (or resumed days later) are
+    # covered up to now. kept as a scope of its own so a resumed run cuts the channel the same way
+    def slice_top(self, channel_id):
+        scope = slice_scope(channel_id, "top")
+        top = self.resume_cursor(scope)[0]
+        if top is None:
+            top = now_snowflake()
+            if self.journal:
+                self.journal.save_cursor(self.run_id, scope, top)
+        return int(top)
+
+    # runs scans (callables returning page generators) on up to `workers` threads and
+    # yields their pages as they come in
+    def merge_scans(self, scans, workers):
+        if not scans:
+            return
+        todo = queue.Queue()
+        for scan in scans:
+            todo.put(scan)
+        merged = queue.Queue(maxsize=workers * 2)
+        closed = threading.Event()
+
+        def put(item):
+            while self.running and not closed.is_set():
+                try:
+                    merged.put(item, timeout=0.5)
+                    return
+                except queue.Full:
+                    pass
+
+        def worker():
+            try:
+                while self.running and not closed.is_set():
+                    try:
+                        scan = todo.get_nowait()
+                    except queue.Empty:
+                        break
+                    for page in scan():
+                        put(page)
+                        if not self.running or closed.is_set():
+                            break # dont keep paging for nobody
+            except Exception as e:
+                put(e)
+            put(None)
+
+        workers = min(workers, len(scans))
+        for _ in range(workers):
+            threading.Thread(target=worker, daemon=True).start()
+        try:
+            finished = 0
+            while finished < workers and self.running:
+                try:
+                    item = merged.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if item is None:
+                    finished += 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            closed.set()
+
+    def consume(self, pages, target):
+        if self.options["dry_run"]:
+            self.collect(pages, target)
+        else:
+            self.delete_messages(pages, target["name"], target["id"] if target["type"] == "server" else None)
+
+    # dry run, only write down what would have been deleted
+    def collect(self, pages, target):
+        for messages, scope_id, cursor in pages:
+            if not self.running:
+                break
+            messages = self.select(messages)
+            self.progress.add_found(scope_id, len(messages))
+            for msg in messages:
+                self.plan.add(target["id"], msg["channel_id"], msg["id"])
+            self.report()
+
+    # one thread runs the enumerator and feeds our messages into a bounded queue while
+    # this one drains it, so the next page is already there when the current one is deleted.
+    # in server channels we moderate, recent messages are collected and bulk deleted instead,
+    # checkpoints after them wait until they are actually gone
+    def delete_messages(self, pages, context, guild_id=None):
+        pending = queue.Queue(maxsize=PIPELINE_DEPTH)
+        drained = threading.Event()  # we stopped taking from the queue, for whatever reason
+        scanner = threading.Thread(target=self.scan_messages, args=(pages, pending, drained), daemon=True)
+        scanner.start()
+        bulk_channels = self.bulk_channels(guild_id) if guild_id else set()
+        batches = {}  # channel id -> messages waiting for a bulk delete
+        held = []     # checkpoints waiting for the batches
+
+        def flush(channel_id=None):
+            for ch in [channel_id] if channel_id else list(batches):
+                self.bulk_delete(ch, batches.pop(ch), context)
+            if not batches:
+                for checkpoint in held:
+                    self.save_checkpoint(checkpoint)
+                held.clear()
+
+        idle_since = None
+        try:
+            while self.running:
+                try:
+                    item = pending.get(timeout=0.5)
+                except queue.Empty:
+                    # the scanner is waiting on a page, only a long stall is worth a small batch
+                    idle_since = idle_since or time.monotonic()
+                    if batches and time.monotonic() - idle_since >= BULK_FLUSH_IDLE:
+                        flush()
+                    continue
+                idle_since = None
+                if item is None:
+                    flush()
+                    break
+                if isinstance(item, Exception):
+                    raise Exception(f"Message deletion failed: {str(item)}")
+                if isinstance(item, Checkpoint):
+                    if batches:
+                        held.append(item)
+                    else:
+                        self.save_checkpoint(item)
+                    continue
+                if self.journal and self.journal.is_deleted(item["id"]):
+                    # search index can lag behind our own deletes
+                    self.progress.add_deleted(context)
+                    continue
+                if item["channel_id"] in bulk_channels and self.bulk_eligible(item["id"]):
+                    batch = batches.setdefault(item["channel_id"], [])
+                    batch.append(item)
+                    if len(batch) >= BULK_DELETE_MAX:
+                        flush(item["channel_id"])
+                    continue
+                self.keep(item)
+                self.delete_message(item["id"], item["channel_id"])
+                self.deleted(item, context)
+        finally:
+            drained.set() # a failed delete would otherwise leave the scanner paging into a full queue
+        self.report(force=True)
+
+    # archived and flushed to disk right before it goes, so a crash never loses the copy of
+    # something the journal already calls deleted
+    def keep(self, item):
+        if self.archive:
+            self.archive.write(item)
+            self.archive.flush(item["channel_id"])
+
+    def deleted(self, item, context):
+        if self.journal:
+            self.journal.record_deleted(self.run_id, item["channel_id"], item["id"])
+        self.client.metrics.count("deleted")
+        self.progress.add_deleted(context)
+        self.report()
+
+    # channels of a guild where we have manage messages, from the crawler's permission work.
+    # the guild's channel list settles it for most guilds, the threads (which search puts
+    # messages under) are only crawled when we can moderate somewhere
+    def bulk_channels(self, guild_id):
+        with self.bulk_lock:
+            if guild_id in self.bulk:
+                return self.bulk[guild_id]
+        manages = lambda ch: ch["permissions"] is not None and ch["permissions"] & MANAGE_MESSAGES
+        try:
+            channels = set()
+            if any(manages(ch) for ch in self.crawler.guild_channels(guild_id)):
+                channels = {ch["id"] for ch in self.crawler.channels(guild_id) if manages(ch)}
+        except Exception:
+            channels = set() # cant tell, single deletes always work
+        with self.bulk_lock:
+            self.bulk[guild_id] = channels
+        return channels
+
+    def bulk_eligible(self, message_id):
+        return timestamp_of(message_id) > time.time() * 1000 - BULK_DELETE_AGE
+
+    # up to 100 messages in one request, discord wants at least two
+    def bulk_delete(self, channel_id, batch, context):
+        if self.archive:
+            for item in batch:
+                self.archive.write(item)
+            self.archive.flush(channel_id) # once for the whole batch, before any of it goes
+        if len(batch) >= 2:
+            response = self.client.post(
+                f"/channels/{channel_id}/messages/bulk-delete",
+                json={"messages": [item["id"] for item in batch]}
+            )
+            if response.status_code == 204:
+                self.client.metrics.count("bulk_deletes")
+                for item in batch:
+                    self.deleted(item, context)
+                return
+            if response.status_code in [401, 403]:
+                # permissions changed under us, dont try again in this channel
+                with self.bulk_lock:
+                    for channels in self.bulk.values():
+                        channels.discard(channel_id)
+            self.client.metrics.count("bulk_fallbacks")
+        for item in batch:
+            self.delete_message(item["id"], item["channel_id"])
+            self.deleted(item, context)
+
+    # runs the filter over a whole page before any of it is queued. plan entries were
+    # filtered when the plan was made and only carry ids anyway
+    def select(self, messages):
+        if self.matches is None or self.options["plan"]:
+            return messages
+        kept = [msg for msg in messages if self.matches(msg)]
+        self.client.metrics.count("filtered_out", len(messages) - len(kept))
+        return kept
+
+    def scan_messages(self, pages, pending, drained):
+        try:
+            for messages, scope_id, cursor in pages:
+                if not self.running or drained.is_set():
+                    break
+                messages = self.select(messages)
+                self.progress.add_found(scope_id, len(messages))
+                self.report()
+                for msg in messages:
+                    self.feed(pending, msg, drained)
+                self.feed(pending, Checkpoint(scope_id, cursor), drained)
+                if drained.is_set():
+                    break # dont fetch another page nobody takes
+        except Exception as e:
+            self.feed(pending, e, drained)
+        finally:
+            # lets the enumerator clean up, merged scans stop their threads
+            if hasattr(pages, "close"):
+                pages.close()
+        self.feed(pending, None, drained)
+
+    def report(self, force=False):
+        if self.progress.due() or force:
+            self.on_stats(self.progress.snapshot())
+
+    # only reached once every message queued before it is gone, so resuming from here never skips any
+    def save_checkpoint(self, checkpoint):
+        if not self.journal:
+            return
+        if checkpoint.cursor is None:
+            self.journal.finish_scope(self.run_id, checkpoint.scope_id)
+            # the channel gets the watermark once all of its slices are through
+            if self.covers_everything() and checkpoint.scope_id in self.history_scopes:
+                self.journal.set_watermark(self.user_id, checkpoint.scope_id, self.mark)
+        else:
+            self.journal.save_cursor(self.run_id, checkpoint.scope_id, checkpoint.cursor)
+
+    # put that gives up once the worker is stopped or the queue isnt drained anymore,
+    # otherwise a full queue would hang the scanner
+    def feed(self, pending, item, drained):
+        while self.running and not drained.is_set():
+            try:
+                pending.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+
+    def delete_message(self, message_id, channel_id):
+        try:
+            response = self.client.delete(f"/channels/{channel_id}/messages/{message_id}")
+            if response.status_code == 404:
+                # already gone, deleted by hand or by an earlier attempt that lost its response
+                self.client.metrics.count("already_deleted")
+                return
+            response.raise_for_status()
+        except Exception as e:
+            raise Exception(f"Delete failed: {str(e)}")
+
+    # takes effect in whatever the run is waiting on, a rate limit, a backoff or the breaker
+    def stop(self):
+        self.running = False
+        self.client.control.stop()
+
+    # holds every request where it is, cursors and rate limit state stay as they are
+    def pause(self):
+        self.client.control.pause()
+
+    def resume(self):
+        self.client.control.resume()
+
+    @property
+    def paused(self):
+        return self.client.control.paused
@@ -0,0 +1,117 @@
+from globals import *
+from discord.snowflake import timestamp_of
+
+# enumerators are generators yielding one (messages, scope_id, cursor) tuple per request.
+# messages are the user's own messages from that page, scope_id is what the cursor belongs
+# to and cursor is where the next page starts, None once the scope is exhausted
+
+class SearchUnavailable(Exception):
+    pass
+
+# pages backwards from before and stops as soon as it crosses after, so a floor close to
+# the newest message only costs the pages above it. first_page is the page at before when
+# the caller already has it (from estimate_history)
+def scan_history(client, channel_id, user_id, before=None, after=None, scope_id=None, first_page=None):
+    scope_id = scope_id or channel_id
+    while True:
+        if first_page is not None:
+            messages, first_page = first_page, None
+        else:
+            messages = fetch_page(client, channel_id, before)
+        client.metrics.count("scanned", len(messages))
+
+        own = [msg for msg in messages if msg["author"]["id"] == user_id and (after is None or int(msg["id"]) > int(after))]
+        if len(messages) < 100 or (after and int(messages[-1]["id"]) <= int(after)):
+            yield own, scope_id, None
+            return
+        before = messages[-1]["id"]
+        yield own, scope_id, before
+
+def fetch_page(client, channel_id, before=None):
+    params = {"limit": 100}
+    if before:
+        params["before"] = before
+    response = client.get(f"/channels/{channel_id}/messages", params=params)
+    response.raise_for_status()
+    return response.json()
+
+# rough size of a channel's history between after and before, from how densely packed the
+# newest page is. one request, snowflakes give the time of every message and the channel's
+# creation. returns (estimate, page) so a plain scan can start from the page instead of fetching it again
+def estimate_history(client, channel_id, before=None, after=None):
+    messages = fetch_page(client, channel_id, before)
+    if len(messages) < 100:
+        return len(messages), messages
+    newest = timestamp_of(messages[0]["id"])
+    oldest = timestamp_of(messages[-1]["id"])
+    start = timestamp_of(after or channel_id)
+    return int(len(messages) * (newest - start) / max(newest - oldest, 1)), messages
+
+# scope is "guilds" or "channels", the search index already filters by author so only our
+# own messages are ever read. pages by max_id instead of offset since we delete as we go
+def search_messages(client, scope, scope_id, user_id, max_id=None, min_id=None, on_total=None, extra=None):
+    first = True
+    seen = set()
+    while True:
+        params = {"author_id": user_id, "include_nsfw": "true", "sort_by": "timestamp", "sort_order": "desc"}
+        if max_id:
+            params["max_id"] = max_id
+        if min_id:
+            params["min_id"] = min_id
+        params.update(extra or {})
+
+        response = client.get(f"/{scope}/{scope_id}/messages/search", params=params)
+        if response.status_code == 202:
+            # discord is still indexing this channel/guild
+            client.control.sleep(response.json().get("retry_after", 2))
+            continue
+        if response.status_code in [400, 401, 403, 404] and first:
+            raise SearchUnavailable(f"search returned {response.status_code}")
+        response.raise_for_status()
+        data = response.json()
+        if first and on_total:
+            on_total(scope_id, data.get("total_results", 0))
+        first = False
+
+        hits = []
+        for group in data.get("messages", []):
+            for msg in group:
+                if msg.get("hit", True) and msg["author"]["id"] == user_id and msg["id"] not in seen:
+                    seen.add(msg["id"])
+                    hits.append(msg)
+        client.metrics.count("scanned", len(hits))
+        if not hits:
+            yield [], scope_id, None
+            return
+
+        max_id = min(hits, key=lambda m: int(m["id"]))["id"]
+        yield hits, scope_id, max_id
+
+# tries the search first and only falls back to a full scan when search cant be used at all
+def search_or_scan(search_pages, scan):
+    try:
+        first = next(search_pages)
+    except SearchUnavailable:
+        yield from scan()
+        return
+    except StopIteration:
+        return
+    yield first
+    yield from search_pages
+
+# replays what a dry run found, one page per 100 ids with the same cursors a history
+# scan would give, so a stopped plan run resumes exactly where it was
+def plan_pages(plan, target_id, resume_cursor):
+    for channel_id, ids in plan.channels_of(target_id):
+        cursor, done = resume_cursor(channel_id)
+        if done:
+            continue
+        if cursor:
+            ids = [i for i in ids if i < int(cursor)]
+        if not ids:
+            yield [], channel_id, None
+            continue
+        for start in range(0, len(ids), 100):
+            page = ids[start:start + 100]
+            last = start + 100 >= len(ids)
+            yield [{"id": str(i), "channel_id": channel_id} for i in page], channel_id, None if last else str(page[-1])
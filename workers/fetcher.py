@@ -1,5 +1,10 @@
-from globals import *
+from gui.qt import *
+from concurrent.futures import ThreadPoolExecutor
+from workers import discovery
+from storage.cache import load_channels, save_channels
 
+# stale while revalidate: whatever was cached for this user is emitted straight away, then
+# dms and servers are fetched side by side and emitted again once both are in
 class DataFetcher(QThread):
     data_loaded = pyqtSignal(list, list)
     error_occurred = pyqtSignal(str)
@@ -8,51 +13,22 @@ class DataFetcher(QThread):
         super().__init__()
 
     def run(self):
+        cached = load_channels(context.user.id)
+        if cached:
+            self.data_loaded.emit(*cached)
         try:
-            dms = self.fetch_dms()
-            servers = self.fetch_servers()
-            self.data_loaded.emit(dms, servers)
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                dms = pool.submit(self.fetch_dms)
+                servers = pool.submit(self.fetch_servers)
+                dms, servers = dms.result(), servers.result()
+            save_channels(context.user.id, dms, servers)
+            if cached is None or (dms, servers) != tuple(cached):
+                self.data_loaded.emit(dms, servers)
         except Exception as e:
             self.error_occurred.emit(str(e))
 
     def fetch_dms(self):
-        try:
-            dms = []
-            channels = requests.get(f"{BASE_URL}/users/@me/channels", headers={"Authorization": context.token}).json()
-            for ch in channels:
-                if ch["type"] in [1, 3]:
-                    recipients = [u["username"] for u in ch.get("recipients", [])]
-                    # get timestamp for sorting
-                    last_message_id = ch.get('last_message_id')
-                    if last_message_id:
-                        timestamp = (int(last_message_id) >> 22) + 1420070400000
-                    else:
-                        channel_id = int(ch['id'])
-                        timestamp = (channel_id >> 22) + 1420070400000
-                    dms.append({
-                        "id": ch["id"],
-                        "name": "DM with " + ", ".join(recipients),
-                        "type": "dm",
-                        "timestamp": timestamp
-                    })
-            # forgot this lowkey
-            dms.sort(key=lambda x: x['timestamp'], reverse=True)
-            return dms
-        except Exception as e:
-            print(f"Error fetching DMs: {e}")
-            return []
+        return discovery.fetch_dms(context.client)
 
     def fetch_servers(self):
-        try:
-            servers = []
-            guilds = requests.get(f"{BASE_URL}/users/@me/guilds", headers={"Authorization": context.token}).json()
-            for guild in guilds:
-                servers.append({
-                    "id": guild["id"],
-                    "name": guild["name"],
-                    "type": "server"
-                })
-            return servers
-        except Exception as e:
-            print(f"Error fetching servers: {e}")
-            return []
\ No newline at end of file
+        return discovery.fetch_servers(context.client)
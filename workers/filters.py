@@ -0,0 +1,73 @@
+import re
+
+LINK = re.compile(r"https?://\S+", re.IGNORECASE)
+HAS_KINDS = ("attachments", "embeds", "links")
+# what discord's search can narrow down itself, so search totals only count matching messages
+SEARCH_HAS = {"attachments": "file", "embeds": "embed", "links": "link"}
+
+# a filter spec is a plain dict so it can sit in the run options (and the journal):
+#   regex        content has to match this
+#   keywords     content has to contain one of these, case insensitive
+#   has          {"attachments": True, "links": False, ...} True requires it, False rules it out
+#   types        message types to keep, e.g. [0, 19] for normal messages and replies
+#   pinned       True only pinned ones, False leaves pinned messages alone
+#   after/before snowflake bounds, both exclusive
+def is_empty(spec):
+    return not spec or all(v is None or v == [] or v == {} or v == "" for v in spec.values())
+
+def has_links(msg):
+    return bool(LINK.search(msg.get("content") or "")) or any(e.get("url") for e in msg.get("embeds", []))
+
+HAS_TESTS = {
+    "attachments": lambda msg: bool(msg.get("attachments")),
+    "embeds": lambda msg: bool(msg.get("embeds")),
+    "links": has_links,
+}
+
+# turns a spec into one predicate over raw message dicts, everything that can be worked
+# out up front (regexes, sets) is done here once instead of per message. None means no filter
+def compile_filter(spec):
+    if is_empty(spec):
+        return None
+    tests = []
+
+    if spec.get("regex"):
+        pattern = re.compile(spec["regex"])
+        tests.append(lambda msg: pattern.search(msg.get("content") or "") is not None)
+    if spec.get("keywords"):
+        words = re.compile("|".join(re.escape(k) for k in spec["keywords"]), re.IGNORECASE)
+        tests.append(lambda msg: words.search(msg.get("content") or "") is not None)
+    for kind, wanted in (spec.get("has") or {}).items():
+        if kind not in HAS_TESTS:
+            raise ValueError(f"unknown has filter {kind}, use one of {', '.join(HAS_KINDS)}")
+        if wanted is not None:
+            test = HAS_TESTS[kind]
+            tests.append(lambda msg, test=test, wanted=wanted: test(msg) == wanted)
+    if spec.get("types"):
+        types = set(spec["types"])
+        tests.append(lambda msg: msg.get("type", 0) in types)
+    if spec.get("pinned") is not None:
+        pinned = spec["pinned"]
+        tests.append(lambda msg: bool(msg.get("pinned")) == pinned)
+    if spec.get("after"):
+        after = int(spec["after"])
+        tests.append(lambda msg: int(msg["id"]) > after)
+    if spec.get("before"):
+        before = int(spec["before"])
+        tests.append(lambda msg: int(msg["id"]) < before)
+
+    if len(tests) == 1:
+        return tests[0]
+    return lambda msg: all(test(msg) for test in tests)
+
+# search params that narrow the results the same way, the predicate still runs on every page
+def search_params(spec):
+    params = {}
+    if not spec:
+        return params
+    has = [SEARCH_HAS[kind] for kind, wanted in (spec.get("has") or {}).items() if wanted and kind in SEARCH_HAS]
+    if has:
+        params["has"] = has
+    if spec.get("pinned") is not None:
+        params["pinned"] = "true" if spec["pinned"] else "false"
+    return params
@@ -0,0 +1,63 @@
+import time
+import threading
+from collections import deque
+
+PROGRESS_INTERVAL = 0.1  # at most ~10 updates a second reach the hooks, however fast we delete
+RATE_WINDOW = 60  # seconds of deletes the throughput (and so the eta) is measured over
+
+# message level progress of a run. totals are estimates: search tells us how many hits a
+# scope has up front, a history scan only knows what it found so far
+class RunProgress:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.estimates = {}  # scope id -> total search reported
+        self.found = {}      # scope id -> own messages found by the enumerators
+        self.deleted = 0
+        self.channels = {}   # channel name -> messages handled in it
+        self.recent = deque()
+        self.last_report = 0.0
+
+    def estimate(self, scope_id, total):
+        with self.lock:
+            self.estimates[scope_id] = total
+
+    def add_found(self, scope_id, count):
+        with self.lock:
+            self.found[scope_id] = self.found.get(scope_id, 0) + count
+
+    def add_deleted(self, name):
+        now = time.monotonic()
+        with self.lock:
+            self.deleted += 1
+            self.channels[name] = self.channels.get(name, 0) + 1
+            self.recent.append(now)
+            while self.recent and self.recent[0] < now - RATE_WINDOW:
+                self.recent.popleft()
+
+    # true at most every PROGRESS_INTERVAL, callers skip the report otherwise
+    def due(self):
+        now = time.monotonic()
+        with self.lock:
+            if now - self.last_report < PROGRESS_INTERVAL:
+                return False
+            self.last_report = now
+            return True
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            scopes = set(self.estimates) | set(self.found)
+            total = sum(max(self.estimates.get(s, 0), self.found.get(s, 0)) for s in scopes)
+            total = max(total, self.deleted)
+            if len(self.recent) > 1:
+                rate = len(self.recent) / max(now - self.recent[0], 1.0)
+            else:
+                rate = 0.0
+            remaining = total - self.deleted
+            return {
+                "deleted": self.deleted,
+                "total": total,
+                "rate": rate,  # deletes per second
+                "eta": remaining / rate if rate else None,
+                "channels": dict(self.channels),
+            }